@@ -0,0 +1,145 @@
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def _render_worker(connection, shared_memory, shard):
+    """
+    Render loop for a worker process.
+    Receives (timecode, frame_offset) and packs the rendered state of each timeline in `shard` into `shared_memory`
+    """
+    renderers = tuple(
+        (timeline.get_renderer(), packer_collection, offset)
+        for timeline, packer_collection, offset in shard
+    )
+    while True:
+        command = connection.recv()
+        if command is None:
+            break
+        timecode, frame_offset = command
+        try:
+            for renderer, packer_collection, offset in renderers:
+                renderer.render(timecode)
+                packer_collection.pack(shared_memory.buf, frame_offset + offset)
+        except Exception:
+            import traceback
+            connection.send(traceback.format_exc())
+        else:
+            connection.send(None)
+    connection.close()
+
+
+class TimelineRendererPool(object):
+    """
+    Render many independent Timelines across worker processes.
+
+    Each (timeline, packer_collection) pair is assigned to a worker. The packer_collection
+    (an `attribute_packer.BasePackerMixin`) must pack the elements animated by the timeline.
+    Workers render their timelines and pack them into a shared memory frame laid out in the order of
+    `timeline_packers` (the same bytes as a `CollectionPackerMixin` of all the packer collections).
+    The main process only collects the finished frames.
+
+    Two frames are double buffered, so the next frame can be submitted while the previous frame is consumed.
+    Timelines/render functions are closures that cannot be pickled, so workers are forked.
+
+        pool = TimelineRendererPool(((timeline1, fixtures1), (timeline2, fixtures2)))
+        pool.submit(timecode)
+        with pool.collect() as frame:
+            ...  # e.g. send frame or `pool.unpack(frame)` to update the objects in this process
+        pool.close()
+    """
+
+    def __init__(self, timeline_packers, processes=None):
+        self.timeline_packers = tuple(timeline_packers)
+        assert self.timeline_packers, 'No timelines to render'
+        self.frame_size = sum(packer_collection.pack_size for _, packer_collection in self.timeline_packers)
+        self._shared_memory = SharedMemory(create=True, size=max(self.frame_size * 2, 1))
+        self._frame_index = 0
+        self._submitted = None
+
+        # Balance the shards by the number of animation items
+        processes = min(processes or multiprocessing.cpu_count(), len(self.timeline_packers))
+        shards = tuple([] for _ in range(processes))
+        shard_loads = [0] * processes
+        offset = 0
+        offsets = []
+        for timeline, packer_collection in self.timeline_packers:
+            offsets.append(offset)
+            offset += packer_collection.pack_size
+        for (timeline, packer_collection), offset in sorted(
+                zip(self.timeline_packers, offsets),
+                key=lambda timeline_packer_offset: len(timeline_packer_offset[0][0]._animation_items),
+                reverse=True,
+        ):
+            shard_index = shard_loads.index(min(shard_loads))
+            shards[shard_index].append((timeline, packer_collection, offset))
+            shard_loads[shard_index] += len(timeline._animation_items) or 1
+
+        context = multiprocessing.get_context('fork')
+        self._workers = []
+        for shard in shards:
+            connection, worker_connection = context.Pipe()
+            process = context.Process(
+                name='timeline_renderer',
+                target=_render_worker,
+                args=(worker_connection, self._shared_memory, shard),
+                daemon=True,
+            )
+            process.start()
+            worker_connection.close()
+            self._workers.append((process, connection))
+        log.debug(f'Rendering {len(self.timeline_packers)} timelines with {processes} processes')
+
+    def submit(self, timecode):
+        """
+        Start rendering `timecode` into the next frame buffer (does not wait for the workers)
+        """
+        assert self._submitted is None, 'collect() the previously submitted frame first'
+        self._frame_index ^= 1
+        self._submitted = self._frame_index * self.frame_size
+        for _, connection in self._workers:
+            connection.send((timecode, self._submitted))
+
+    def collect(self):
+        """
+        Wait for the submitted frame and return a `memoryview` of it.
+        The view is valid until the frame after the next is submitted. Release it before `close()`
+        """
+        assert self._submitted is not None, 'submit() a timecode first'
+        errors = tuple(filter(None, (connection.recv() for _, connection in self._workers)))
+        offset, self._submitted = self._submitted, None
+        if errors:
+            raise Exception('Timeline render worker failed\n' + '\n'.join(errors))
+        return self._shared_memory.buf[offset:offset + self.frame_size]
+
+    def render(self, timecode):
+        self.submit(timecode)
+        return self.collect()
+
+    def unpack(self, frame):
+        """
+        Update the packer collections in this process from a collected frame
+        """
+        offset = 0
+        for _, packer_collection in self.timeline_packers:
+            offset = packer_collection.unpack(frame, offset)
+        return offset
+
+    def close(self):
+        if self._submitted is not None:
+            self.collect().release()
+        for process, connection in self._workers:
+            connection.send(None)
+            connection.close()
+            process.join()
+        self._workers = []
+        self._shared_memory.close()
+        self._shared_memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -2,6 +2,7 @@ import pytest
 from collections import namedtuple
 
 from .timeline import Timeline
+from ..attribute_packer import AttributePackerMixin, CollectionPackerMixin
 
 
 class Location(object):
@@ -10,6 +11,20 @@ class Location(object):
         self.y = y
 
 
+class PackedLocation(Location, AttributePackerMixin):
+    def __init__(self):
+        Location.__init__(self)
+        AttributePackerMixin.__init__(self, (
+            AttributePackerMixin.Attribute('x', 'onebyte'),
+            AttributePackerMixin.Attribute('y', 'onebyte'),
+        ))
+
+
+class PackedLocations(CollectionPackerMixin):
+    def __init__(self, locations):
+        CollectionPackerMixin.__init__(self, locations)
+
+
 @pytest.fixture()
 def tl():
     return Timeline()
@@ -352,3 +367,205 @@ def test_split_multiple(tl):
     ren.render(2)
     assert o1['a'] == 100
     assert o1['b'] == 100
+
+
+def test_render_seek_backwards(tl, o1):
+    tl.to(o1, 10, {'x': 100}).to(o1, 10, {'y': 100})
+    ren = tl.get_renderer()
+
+    ren.render(15)
+    assert o1.x == 100
+    assert o1.y == 50
+
+    ren.render(5)
+    assert o1.x == 50
+    assert o1.y == 0  # The second animation item is reverted
+
+    ren.render(20)
+    assert o1.x == 100
+    assert o1.y == 100
+
+    ren.render(0)
+    assert o1.x == 0
+    assert o1.y == 0
+
+
+def _timeline_to(tl, o1):
+    for index in range(20):
+        tl.to(o1, 5, {'a': index * 10}, timestamp=index * 3)
+        tl.to(o1, 2, {'b': index}, timestamp=index * 3 + 1)
+    return (31, 7, 50, 0.5, 22)
+
+
+def _timeline_set(tl, o1):
+    tl.set_(o1, {'a': 1}, timestamp=0)
+    tl.set_(o1, {'a': 2}, timestamp=5)
+    tl.to(o1, 2, {'b': 10}, timestamp=4)
+    return (3, 6, 4.5, 0)
+
+
+def _timeline_from_to(tl, o1):
+    tl.from_to(o1, 2, {'a': 0}, {'a': 100}, timestamp=0)
+    tl.from_to(o1, 5, {'a': 500}, {'a': 600}, timestamp=5)
+    tl.from_(o1, 2, {'b': 50}, timestamp=6)
+    return (3, 7.5, 1, 9, 6.5)
+
+
+@pytest.mark.parametrize('build_timeline', (_timeline_to, _timeline_set, _timeline_from_to))
+def test_render_seek_matches_forward_playback(tl, build_timeline):
+    o1 = {'a': 0, 'b': 0}
+    timecodes = build_timeline(tl, o1)
+    ren = tl.get_renderer()
+    ren.render(tl.duration)
+    for timecode in timecodes:
+        ren.render(timecode)
+        seek_state = dict(o1)
+        ren_forward = tl.get_renderer()
+        ren_forward.render(0)
+        ren_forward.render(timecode)
+        assert o1 == seek_state, timecode
+
+
+def test_render_seek_over_set(tl):
+    o1 = {'x': 0}
+    tl.set_(o1, {'x': 1}, timestamp=0)
+    tl.set_(o1, {'x': 2}, timestamp=5)
+    ren = tl.get_renderer()
+    ren.render(6)
+    assert o1['x'] == 2
+    ren.render(3)
+    assert o1['x'] == 1
+    ren_forward = tl.get_renderer()
+    ren_forward.render(0)
+    ren_forward.render(3)
+    assert o1['x'] == 1
+
+
+def test_render_seek_over_from_to(tl):
+    o1 = {'x': 0}
+    tl.from_to(o1, 2, {'x': 0}, {'x': 100}, timestamp=0)
+    tl.from_to(o1, 5, {'x': 500}, {'x': 600}, timestamp=5)
+    ren = tl.get_renderer()
+    ren.render(10)
+    assert o1['x'] == 600
+    ren.render(3)
+    assert o1['x'] == 100
+    ren.render(1)
+    assert o1['x'] == 50
+    ren.render(7.5)
+    assert o1['x'] == 550
+
+
+def test_timeline_render_multiple_elements_batch(tl, o1, o2):
+    o1.x = 100
+    tl.to((o1, o2), 10, {'x': 50}, batch=True)
+    assert len(tl._animation_items) == 1
+
+    ren = tl.get_renderer()
+
+    ren.render(5)
+    assert o1.x == 75
+    assert o2.x == 25
+    ren.render(10)
+    assert o1.x == 50
+    assert o2.x == 50
+
+
+def test_timeline_render_int_indexed_element(tl):
+    """
+    Elements with an int only `__setitem__` (like pygame.Rect) are animated with setattr
+    """
+    class IndexedLocation(Location):
+        def __setitem__(self, index, value):
+            if not isinstance(index, int):
+                raise TypeError('index must be an int')
+            setattr(self, ('x', 'y')[index], value)
+
+    o = IndexedLocation()
+    tl.to(o, 10, {'x': 100})
+    tl.get_renderer().render(5)
+    assert o.x == 50
+
+
+def test_bake_array(tl, o1):
+    np = pytest.importorskip('numpy')
+    tl.to(o1, 1, {'x': 100}).to(o1, 1, {'y': 100})
+    baked = tl.bake(4)
+    assert baked.shape == (9, 2)
+    assert baked[:, 0].tolist() == [0, 25, 50, 75, 100, 100, 100, 100, 100]
+    assert baked[:, 1].tolist() == [0, 0, 0, 0, 0, 25, 50, 75, 100]
+
+
+def test_bake_frame_packer(tl):
+    from ..attribute_packer import MemoryFramePacker
+
+    o1 = PackedLocation()
+    tl.to(o1, 1, {'x': 1}).to(o1, 1, {'y': 1})
+    frame_packer = tl.bake(2, MemoryFramePacker(PackedLocations((o1, ))))
+    assert frame_packer.frames == 5
+    assert bytes(frame_packer.getbuffer()) == bytes((0, 0, 127, 0, 255, 0, 255, 127, 255, 255))
+
+    o1.x = o1.y = 0
+    frame_packer.restore_frame(3)
+    assert (o1.x, o1.y) == (1, 127 / 255)
+
+
+def test_bake_non_integer_duration(tl):
+    from ..attribute_packer import MemoryFramePacker
+
+    o1 = PackedLocation()
+    tl.to(o1, 0.57, {'x': 1})
+    frame_packer = tl.bake(100, MemoryFramePacker(PackedLocations((o1, ))))
+    assert frame_packer.frames == 58
+    frame_packer.restore_frame(57)
+    assert o1.x == 1
+
+
+def test_tween_array():
+    np = pytest.importorskip('numpy')
+    Tween = Timeline.Tween
+    n = np.linspace(0, 1, 5)
+
+    assert Tween.tween_array(Tween.tween_linear, n).tolist() == [0, 0.25, 0.5, 0.75, 1]
+    assert Tween.tween_array(Tween.tween_step(2), n).tolist() == [0, 0, 0.5, 0.5, 1]
+    assert Tween.tween_array(Tween.tween_invert(Tween.tween_linear), n).tolist() == [1, 0.75, 0.5, 0.25, 0]
+    tween_a, tween_b = Tween.tween_progress_split(Tween.tween_linear, 0.5)
+    assert Tween.tween_array(tween_b, n).tolist() == [0.5, 0.625, 0.75, 0.875, 1]
+
+    with pytest.raises(ValueError):
+        Tween.tween_linear(np.array((0.5, 1.5)))
+
+
+def test_tween_array_scalar_only_fallback():
+    np = pytest.importorskip('numpy')
+    import math
+
+    def tween_scalar_only(n):
+        if n < 0.5:
+            return 0.0
+        return math.sqrt(n)
+
+    n = np.array(((0.0, 0.25), (0.25, 1.0)))
+    result = Timeline.Tween.tween_array(Timeline.Tween.tween_invert(tween_scalar_only), n)
+    assert result.shape == (2, 2)
+    assert result.tolist() == [[1.0, math.sqrt(0.75)], [math.sqrt(0.75), 0.0]]
+
+
+def test_renderer_pool():
+    from .renderer_pool import TimelineRendererPool
+
+    locations = tuple(PackedLocation() for _ in range(3))
+    timeline_packers = tuple(
+        (Timeline().to(location, 1, {'x': 1, 'y': index / 2}), PackedLocations((location, )))
+        for index, location in enumerate(locations)
+    )
+    with TimelineRendererPool(timeline_packers, processes=2) as pool:
+        with pool.render(1) as frame:
+            assert bytes(frame) == bytes((255, 0, 255, 127, 255, 255))
+        pool.submit(0.5)
+        with pool.collect() as frame:
+            assert bytes(frame) == bytes((127, 0, 127, 63, 127, 127))
+            pool.unpack(frame)
+    assert locations[2].x == 127 / 255
+    # Rendering happened in the workers
+    assert locations[0].y == 0
@@ -1,11 +1,18 @@
 from collections import namedtuple
-from functools import reduce
+from functools import reduce, partial
 from numbers import Number
 from copy import copy
+from bisect import bisect_left, bisect_right, insort
+from itertools import chain
 
-from ..data import blend, get_attr_or_item, set_attr_or_item_all
+from ..data import get_attr_or_item, set_attr_or_item_all
 from ..limit import limit
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 import logging
 log = logging.getLogger(__name__)
 
@@ -95,10 +102,12 @@ class Timeline(object):
         return self
 
     def set_(self, elements, values, timestamp=None):
-        elements = self._normalize_elements(elements)
+        elements = tuple(self._normalize_elements(elements))
         def _render_item(tween_pos):
             for element in elements:
                 set_attr_or_item_all(source=values, target=element)
+        _render_item._elements = elements  # for debugging the function
+        _render_item._values = values
         return self.animation_item(timestamp, 0, _render_item)
 
     # FromTo Layer -------------------------------------------------------------
@@ -112,44 +121,85 @@ class Timeline(object):
 
     @staticmethod
     def _get_default_render_item_func(element, valuesFrom={}, valuesTo={}):
+        _render_item = Timeline._get_compiled_render_item_func((element, ), valuesFrom, valuesTo)
+        _render_item._element = element  # for debugging the function
+        _render_item._valuesFrom, = _render_item._valuesFroms
+        _render_item._valuesTo, = _render_item._valuesTos
+        return _render_item
+
+    @staticmethod
+    def _get_compiled_render_item_func(elements, valuesFrom={}, valuesTo={}):
+        """
+        Render function that blends `valuesFrom` -> `valuesTo` on all `elements`.
+        Missing from/to values are derived from each element and the (setter, field, from, to) list is compiled
+        at the absolute final moment before the item is first animated.
+        Each render is then a single pass over the compiled list, without the per frame key/setter introspection of `data.blend`.
+
+        >>> o1, o2 = {'a': 0}, {'a': 100}
+        >>> _render_item = Timeline._get_compiled_render_item_func((o1, o2), valuesTo={'a': 50})
+        >>> _render_item(0.5)
+        >>> o1, o2
+        ({'a': 25.0}, {'a': 75.0})
+        """
         assert valuesFrom or valuesTo, 'No animation values provided'
         assert isinstance(valuesFrom, dict)
         assert isinstance(valuesTo, dict)
         if valuesFrom and valuesTo:
             assert valuesFrom.keys() == valuesTo.keys(), 'from/to keys should be symmetrical'
-        valuesFrom = copy(valuesFrom)
-        valuesTo = copy(valuesTo)
-
-        def _derive_missing_from_to_values():
-            if bool(valuesFrom) ^ bool(valuesTo):
-                source = valuesFrom or valuesTo
-                destination = valuesFrom if not valuesFrom else valuesTo
-                for field in source.keys():
-                    destination[field] = copy(get_attr_or_item(element, field))
-            assert valuesFrom.keys() == valuesTo.keys(), 'from/to animations should be symmetrical'  # Temp assertion for development
+        valuesFroms = tuple(copy(valuesFrom) for element in elements)
+        valuesTos = tuple(copy(valuesTo) for element in elements)
+        compiled = []
+
+        def _compile():
+            for element, valuesFrom, valuesTo in zip(elements, valuesFroms, valuesTos):
+                if bool(valuesFrom) ^ bool(valuesTo):
+                    source = valuesFrom or valuesTo
+                    destination = valuesFrom if not valuesFrom else valuesTo
+                    for field in source.keys():
+                        destination[field] = copy(get_attr_or_item(element, field))
+                assert valuesFrom.keys() == valuesTo.keys(), 'from/to animations should be symmetrical'  # Temp assertion for development
+                for field in valuesTo.keys():
+                    # Choose the setter once, the same way as `data.set_attr_or_item`
+                    try:
+                        element[field] = valuesFrom[field]
+                        setter = element.__setitem__
+                    except TypeError:
+                        setter = partial(setattr, element)
+                    compiled.append((setter, field, valuesFrom[field], valuesTo[field]))
 
         def _render_item(tween_pos):
-            _derive_missing_from_to_values()  # done at the absolute final moment before the item is animated
-            blend(valuesFrom, valuesTo, target=element, blend=min(max(tween_pos, 0), 1))
-
-        _render_item._element = element  # for debugging the function
-        _render_item._valuesFrom = valuesFrom
-        _render_item._valuesTo = valuesTo
+            if not compiled:
+                _compile()
+            blend = min(max(tween_pos, 0), 1)
+            inverse_blend = 1 - blend
+            for setter, field, value_from, value_to in compiled:
+                setter(field, (value_from * inverse_blend) + (value_to * blend))
+
+        _render_item._elements = elements  # for debugging the function
+        _render_item._revertible = not valuesFrom  # tween(0) restores the values the element had before the item started
+        _render_item._valuesFroms = valuesFroms
+        _render_item._valuesTos = valuesTos
 
         return _render_item
 
-    def from_to(self, elements, duration, valuesFrom={}, valuesTo={}, tween=None, timestamp=None, offset=0):
+    def from_to(self, elements, duration, valuesFrom={}, valuesTo={}, tween=None, timestamp=None, offset=0, batch=False):
+        """
+        batch: Animate all `elements` with a single AnimationItem (one tween evaluation per frame for all elements).
+               `AnimationItem.element` is not available for batched items.
+        """
         elements = self._normalize_elements(elements)
         timestamp = self._resolve_timestamp(timestamp, offset)
+        if batch:
+            return self.animation_item(timestamp, duration, self._get_compiled_render_item_func(tuple(elements), valuesFrom, valuesTo), tween)
         for element in elements:
             self.animation_item(timestamp, duration, self._get_default_render_item_func(element, valuesFrom, valuesTo), tween)
         return self
 
-    def to(self, elements, duration, valuesTo, tween=None, timestamp=None):
-        return self.from_to(elements, duration, valuesTo=valuesTo, tween=tween, timestamp=timestamp)
+    def to(self, elements, duration, valuesTo, tween=None, timestamp=None, batch=False):
+        return self.from_to(elements, duration, valuesTo=valuesTo, tween=tween, timestamp=timestamp, batch=batch)
 
-    def from_(self, elements, duration, values, tween=None, timestamp=None):
-        return self.from_to(elements, duration, valuesFrom=values, tween=tween, timestamp=timestamp)
+    def from_(self, elements, duration, values, tween=None, timestamp=None, batch=False):
+        return self.from_to(elements, duration, valuesFrom=values, tween=tween, timestamp=timestamp, batch=batch)
 
     def staggerTo(self, elements, duration, valuesTo, item_delay, tween=None, timestamp=None):
         """
@@ -304,6 +354,58 @@ class Timeline(object):
     def __neg__(self):
         return self.__invert__()
 
+    # Bake ---------------------------------------------------------------------
+
+    @property
+    def animated_fields(self):
+        """
+        Unique (element, field) pairs animated by this timeline (in the order they are first animated)
+
+        >>> o1, o2 = {'a': 0, 'b': 0}, {'a': 0}
+        >>> Timeline().to((o1, o2), 1, {'a': 1}).set_(o1, {'b': 1}).animated_fields
+        (({'a': 0, 'b': 0}, 'a'), ({'a': 0}, 'a'), ({'a': 0, 'b': 0}, 'b'))
+        """
+        fields = {}
+        for i in sorted(self._animation_items, key=lambda item: item.timestamp):
+            render_item_func = i.render_item_func
+            elements = getattr(render_item_func, '_elements', ())
+            if hasattr(render_item_func, '_valuesTos'):
+                keys_per_element = (
+                    values_from.keys() | values_to.keys()
+                    for values_from, values_to in zip(render_item_func._valuesFroms, render_item_func._valuesTos)
+                )
+            elif hasattr(render_item_func, '_values'):
+                keys_per_element = (render_item_func._values.keys() for element in elements)
+            else:
+                continue  # Custom `animation_item` render functions do not describe their fields
+            for element, keys in zip(elements, keys_per_element):
+                for field in sorted(keys):
+                    fields.setdefault((id(element), field), (element, field))
+        return tuple(fields.values())
+
+    def bake(self, fps, frame_packer=None):
+        """
+        Render the timeline at a fixed `fps` (from timecode 0 to duration inclusive) so it can be played back without tweening
+
+        frame_packer: an `attribute_packer.BaseFramePacker` packing the animated elements. Each frame is saved to it.
+        Without a frame_packer a numpy array of shape (frames, len(animated_fields)) is returned.
+        """
+        assert fps > 0, 'fps rate must be provided'
+        frames = int(round(self.duration * fps, 9)) + 1  # round away float error (0.57 * 100 == 56.99999999999999)
+        renderer = self.get_renderer()
+        if frame_packer:
+            for frame in range(frames):
+                renderer.render(frame / fps)
+                frame_packer.save_frame(frame)
+            return frame_packer
+        assert np, 'numpy is required to bake to an array. Provide a frame_packer'
+        fields = self.animated_fields
+        baked = np.empty((frames, len(fields)), dtype=np.float64)
+        for frame in range(frames):
+            renderer.render(frame / fps)
+            baked[frame] = tuple(get_attr_or_item(element, field) for element, field in fields)
+        return baked
+
     # Renderer -----------------------------------------------------------------
 
     def get_renderer(self, *args, **kwargs):
@@ -314,35 +416,64 @@ class Timeline(object):
         return Timeline.Renderer(self, *args, **kwargs)
 
     class Renderer(object):
+        """
+        Forward playback keeps a list of `_active` items (sorted by expiry).
+        Seeking backwards reverts the items started since the target timecode (rendered at their start position)
+        and loads the active set for the target timecode from an `IntervalTree`, so seeking/scrubbing costs O(log n + k)
+        rather than replaying the timeline from the start.
+        Only `to` items (from values taken from the element) can be reverted. Seeking back over `set_`, `from_` or `from_to` items
+        replays the timeline from the start.
+        """
         def __init__(self, parent_timeline, delay=0, repeat=0, repeatDelay=0, onUpdate=None, onRepeat=None, onComplete=None):
             self._items = tuple(sorted(parent_timeline._animation_items, key=lambda item: item.timestamp))
+            self._item_timestamps = tuple(item.timestamp for item in self._items)
+            self._interval_tree = None
             self.reset()
             self.onUpdate = onUpdate
             self.onRepeat = onRepeat
             self.onComplete = onComplete
 
         def reset(self):
-            self._active = []
+            self._active = []  # (timestamp_end, index) of items in `_items`. Ordered by expiry for efficient removal
             self._next_item_index = 0
             self._last_timecode = 0
 
+        @property
+        def interval_tree(self):
+            if not self._interval_tree:
+                self._interval_tree = Timeline.IntervalTree((item.timestamp, item.timestamp_end) for item in self._items)
+            return self._interval_tree
+
+        def seek(self, timecode):
+            """
+            Revert items that have started after `timecode` (newest first) and set the `_active` items for `timecode`
+            If any of those items can not be reverted, `reset()` so the next render replays from the start
+            """
+            next_item_index = bisect_right(self._item_timestamps, timecode)
+            reverted_items = self._items[next_item_index:self._next_item_index]
+            if not all(i.duration and getattr(i.render_item_func, '_revertible', False) for i in reverted_items):
+                self.reset()
+                return
+            for i in reversed(reverted_items):
+                i.render_item_func(i.tween(0))
+            self._active = sorted((self._items[index].timestamp_end, index) for index in self.interval_tree.at(timecode))
+            self._next_item_index = next_item_index
+            self._last_timecode = timecode
+
         def render(self, timecode):
-            # Active item cache only allows us to go forwards.
-            # If we travel backwards in time reset the cache state and calculate form scratch
             if timecode < self._last_timecode:
-                self.reset()
+                self.seek(timecode)
             self._last_timecode = timecode
 
             # Update _active items list for current timecode
-            has_more_items = lambda: self._next_item_index < len(self._items)
-            timecode_is_in_next_item = lambda: timecode >= self._next_item.timestamp
-            while has_more_items() and timecode_is_in_next_item():
-                self._active.append(self._next_item)
-                self._next_item_index += 1
-            self._active.sort(key=lambda i: i.timestamp_end)  # Sort in order of expiry for efficient removal
+            next_item_index = bisect_right(self._item_timestamps, timecode, lo=self._next_item_index)
+            for index in range(self._next_item_index, next_item_index):
+                insort(self._active, (self._items[index].timestamp_end, index))
+            self._next_item_index = next_item_index
 
             # Render _active items
-            for i in self._active:
+            for _, index in self._active:
+                i = self._items[index]
                 if i.duration == 0 or i.timestamp_end < timecode:
                     normalized_pos = 1
                 else:
@@ -350,8 +481,7 @@ class Timeline(object):
                 i.render_item_func(i.tween(normalized_pos))
 
             # Expire passed animation items form _active
-            while self._active and self._active[0].timestamp_end < timecode:
-                self._active.pop(0)
+            del self._active[:bisect_left(self._active, (timecode, ))]
 
             # Todo: Implement events
             #if timecode >= 1:
@@ -361,9 +491,71 @@ class Timeline(object):
             #    if self.onUpdate:
             #        self.onUpdate()
 
-        @property
-        def _next_item(self):
-            return self._items[self._next_item_index]
+    class IntervalTree(object):
+        """
+        Static centered interval tree. Returns the indexes of the (start, end) intervals containing a point in O(log n + k)
+
+        >>> tree = Timeline.IntervalTree(((0, 10), (5, 15), (20, 30), (12, 12)))
+        >>> sorted(tree.at(7))
+        [0, 1]
+        >>> sorted(tree.at(10))
+        [0, 1]
+        >>> sorted(tree.at(12))
+        [1, 3]
+        >>> sorted(tree.at(17))
+        []
+        >>> sorted(tree.at(30))
+        [2]
+        >>> sorted(Timeline.IntervalTree(()).at(0))
+        []
+        """
+        Node = namedtuple('Node', ('center', 'by_start', 'by_end', 'left', 'right'))
+
+        def __init__(self, intervals):
+            self._root = self._build(tuple(enumerate(intervals)))
+
+        @classmethod
+        def _build(cls, intervals):
+            if not intervals:
+                return None
+            points = sorted(chain.from_iterable(interval for _, interval in intervals))
+            center = points[len(points) // 2]
+            left, right, overlapping = [], [], []
+            for index_interval in intervals:
+                start, end = index_interval[1]
+                if end < center:
+                    left.append(index_interval)
+                elif start > center:
+                    right.append(index_interval)
+                else:
+                    overlapping.append(index_interval)
+            return cls.Node(
+                center=center,
+                by_start=tuple(sorted(overlapping, key=lambda index_interval: index_interval[1][0])),
+                by_end=tuple(sorted(overlapping, key=lambda index_interval: index_interval[1][1], reverse=True)),
+                left=cls._build(left),
+                right=cls._build(right),
+            )
+
+        def at(self, point):
+            node = self._root
+            while node:
+                if point < node.center:
+                    for index, (start, end) in node.by_start:
+                        if start > point:
+                            break
+                        yield index
+                    node = node.left
+                elif point > node.center:
+                    for index, (start, end) in node.by_end:
+                        if end < point:
+                            break
+                        yield index
+                    node = node.right
+                else:
+                    for index, _ in node.by_start:
+                        yield index
+                    break
 
 
     # Tweens ---------------------------------------------------------------
@@ -377,10 +569,33 @@ class Timeline(object):
 
         @staticmethod
         def _checkRange(n):
-            """Raises ValueError if the argument is not between 0.0 and 1.0."""
+            """Raises ValueError if the argument (or any value of a numpy array argument) is not between 0.0 and 1.0."""
+            if np is not None and isinstance(n, np.ndarray):
+                if n.size and (n.min() < 0.0 or n.max() > 1.0):
+                    raise ValueError('Argument must be between 0.0 and 1.0.')
+                return
             if not 0.0 <= n <= 1.0:
                 raise ValueError('Argument must be between 0.0 and 1.0.')
 
+        @staticmethod
+        def tween_array(tween_func, n):
+            """
+            Evaluate `tween_func` over a numpy array of progress values in one call.
+            The tween functions in this class (and their split/invert/step modifications) accept numpy arrays.
+            Scalar only tween functions (e.g. most `pytweening` functions) fail or return the wrong shape with arrays
+            and are evaluated value by value. Tween functions can opt out of the array attempt with `tween_func.vectorised = False`
+            """
+            assert np, 'numpy is required for tween_array'
+            n = np.asarray(n, dtype=np.float64)
+            if getattr(tween_func, 'vectorised', True):
+                try:
+                    result = np.asarray(tween_func(n), dtype=np.float64)
+                    if result.shape == n.shape:
+                        return result
+                except (TypeError, ValueError):
+                    pass
+            return np.fromiter(map(tween_func, n.flat), dtype=np.float64, count=n.size).reshape(n.shape)
+
         @staticmethod
         def _split_values(*values, floor=0, ceiling=1):
             """
@@ -20,15 +20,13 @@ python3 hash_mover.py --cache_filename_source karakara_files.remote.cache --cach
 KARAKARA_DEBUG=True python processmedia.py process ~/Applications/KaraKara/files/
 
 
-WARNING:
-  possible dataloss
-  rename 1.txt to temp.txt
+Moves are planned with `plan_moves` before anything is touched:
+  swapped files (1.txt <-> 2.txt) and longer rename cycles are resolved through a temporary name
+  rename 1.txt to .hash_mover.0.1.txt
   rename 2.txt to 1.txt
-  rename temp.txt to 2.txt
+  rename .hash_mover.0.1.txt to 2.txt
 
-  syncing this will LOOSE DATA
-  There is not currently detection of files with the same name
-  1.txt could be moved over 2.txt and - 2.txt is now completely the contentents of 1.txt - the contents of 2.txt is now lost
+  A move is never performed over an existing file that is not itself being moved away.
 
 """
 import sys
@@ -51,6 +49,9 @@ log = logging.getLogger(__name__)
 VERSION = "0.0"
 DEFAULT_IGNORE_REGEX = r'\.bak|\.git|\.DS_Store|\.txt'  # TODO: This should enforce end of string terms only
 DEFAULT_FILE_REGEX = r'.*'
+DEFAULT_BLOCKSIZE = 1024 * 1024
+DEFAULT_WORKERS = None
+CACHE_VERSION = 1
 
 # Encode --------
 
@@ -69,12 +70,15 @@ import collections
 import re
 
 
+def _cache_key(stat):
+    return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
 FileScan = collections.namedtuple('FileScan', ['folder', 'file', 'absolute', 'relative', 'hash', 'stats'])
-def file_scan(path, file_regex=None, ignore_regex=r'\.git', hasher=None, stats=False):  #, func_progress=lambda f: None
+def _walk(path, file_regex=None, ignore_regex=r'\.git'):
     """
-    return (folder, file, folder+file, folder-path+file)
+    yield (root, file) for files matching the regexs
     """
-    stater = (lambda f: os.stat(f)) if stats else (lambda f: None)
     if not file_regex:
         file_regex = '.*'
     if isinstance(file_regex, str):
@@ -88,32 +92,80 @@ def file_scan(path, file_regex=None, ignore_regex=r'\.git', hasher=None, stats=F
             continue
         for f in files:
             if file_regex.match(f) and not ignore_regex.search(f):
-                yield FileScan(
-                    folder=root,
-                    file=f,
-                    absolute=os.path.join(root, f),
-                    relative=os.path.join(root.replace(path, ''), f).strip('/'),
-                    hash=hashfile(os.path.join(root, f), hasher),
-                    stats=stater(os.path.join(root, f)),
-                )
+                yield root, f
+
+
+def _file_scan_item(path, root, f, hasher=None, stats=False, blocksize=DEFAULT_BLOCKSIZE, cache=None):
+    absolute = os.path.join(root, f)
+    relative = os.path.join(root.replace(path, ''), f).strip('/')
+    stat = os.stat(absolute) if stats or cache is not None else None
+    hash = None
+    if cache is not None:
+        cached = cache.get(relative)
+        if cached and tuple(cached[:3]) == _cache_key(stat):
+            hash = cached[3]
+    if hash is None:
+        hash = hashfile(absolute, hasher, blocksize)
+    return FileScan(
+        folder=root,
+        file=f,
+        absolute=absolute,
+        relative=relative,
+        hash=hash,
+        stats=stat,
+    )
+
+
+def file_scan(path, file_regex=None, ignore_regex=r'\.git', hasher=None, stats=False, workers=None, blocksize=DEFAULT_BLOCKSIZE, cache=None):
+    """
+    return (folder, file, folder+file, folder-path+file)
+
+    `cache` is a dict of {relative: (size, mtime_ns, inode, hash)}. Files with a matching
+    size/mtime/inode reuse the cached hash and are not read. `stats` are always returned when using a cache.
 
+    With `workers`, the directory walk runs in the calling thread while files are read/hashed
+    in a pool of `workers` threads (hashlib and file reads release the GIL).
+    At most `workers * 2` files are in flight and results are yielded in walk order.
+    """
+    scan_item = partial(_file_scan_item, path, hasher=hasher, stats=stats, blocksize=blocksize, cache=cache)
+    if not workers or workers <= 1:
+        for root, f in _walk(path, file_regex, ignore_regex):
+            yield scan_item(root, f)
+        return
 
-def hashfile(filehandle, hasher=hashlib.sha256, blocksize=65536):
+    from concurrent.futures import ThreadPoolExecutor
+    pending = collections.deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hashfile') as executor:
+        try:
+            for root, f in _walk(path, file_regex, ignore_regex):
+                pending.append(executor.submit(scan_item, root, f))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def hashfile(filehandle, hasher=hashlib.sha256, blocksize=DEFAULT_BLOCKSIZE):
     if not hasher:
         return
     if isinstance(filehandle, str):
         filename = filehandle
-        filehandle = open(filename, 'rb')
-    hasher = hasher()
-    buf = filehandle.read(blocksize)
-    while len(buf) > 0:
-        hasher.update(buf)
-        buf = filehandle.read(blocksize)
-    digest = hasher.hexdigest()
-    if filename:
-        filehandle.close()
+        # Unbuffered - readinto fills our buffer directly without an intermediate copy
+        with open(filename, 'rb', buffering=0) as filehandle:
+            digest = hashfile(filehandle, hasher, blocksize)
         log.debug('hashfile - {0} - {1}'.format(digest, filename))
-    return digest
+        return digest
+    hasher = hasher()
+    buf = bytearray(blocksize)
+    view = memoryview(buf)
+    size = filehandle.readinto(buf)
+    while size:
+        hasher.update(view[:size])
+        size = filehandle.readinto(buf)
+    return hasher.hexdigest()
 
 
 # ------------------------------------------------------------------------------
@@ -135,55 +187,189 @@ class ProgressCounter(object):
 progress_counter = ProgressCounter()
 
 
-def hash_files(folder, file_regex=None, ignore_regex=None, hasher=hashlib.sha256, func_progress=progress_counter.progress):
-    return {
-        f.hash: f.relative
-        for f in file_scan(folder, file_regex=file_regex, ignore_regex=ignore_regex, hasher=hasher, func_progress=func_progress)
-    }
+def hash_files(folder, file_regex=None, ignore_regex=None, hasher=hashlib.sha256, func_progress=progress_counter.progress, workers=DEFAULT_WORKERS, blocksize=DEFAULT_BLOCKSIZE, cache=None):
+    """
+    return {hash: relative}
+
+    If a `cache` dict is given, unchanged files reuse their cached hash and
+    `cache` is replaced with the entries for the files currently in `folder`
+    """
+    previous_cache = dict(cache) if cache is not None else None
+    if cache is not None:
+        cache.clear()
+    file_dict = {}
+    for f in file_scan(folder, file_regex=file_regex, ignore_regex=ignore_regex, hasher=hasher, workers=workers, blocksize=blocksize, cache=previous_cache):
+        file_dict[f.hash] = f.relative
+        if cache is not None:
+            cache[f.relative] = _cache_key(f.stats) + (f.hash, )
+        func_progress(file_dict)
+    return file_dict
+
+
+def load_cache(cache_filename):
+    """
+    return {relative: (size, mtime_ns, inode, hash)} or an empty dict if there is no usable cache
+    """
+    try:
+        with open(cache_filename, 'r') as f:
+            data = data_load(f)
+        assert data.get('version') == CACHE_VERSION
+        cache = {relative: tuple(entry) for relative, entry in data['files'].items()}
+        log.info('Loaded data from cache - {0}'.format(cache_filename))
+        return cache
+    except IOError:
+        pass
+    except Exception:
+        log.warn('cache file is corrupted or an old format - ignoring {0}'.format(cache_filename))
+    return {}
+
+
+def save_cache(cache_filename, cache):
+    """
+    Write the cache to a temporary file in the same folder and rename it over `cache_filename`,
+    so an interrupted run never leaves a truncated cache
+    """
+    import tempfile
+    fd, temp_filename = tempfile.mkstemp(prefix='.{0}.'.format(os.path.basename(cache_filename)), dir=os.path.dirname(os.path.abspath(cache_filename)))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            data_dump({'version': CACHE_VERSION, 'files': cache}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_filename, cache_filename)
+    except BaseException:
+        os.remove(temp_filename)
+        raise
+    log.info('Saving cache data - {0}'.format(cache_filename))
 
 
 def hash_files_cache(folder, cache_filename, func_hasher):
-    file_dict = {}
+    """
+    Incrementally hash `folder`. Only files that are new or have a changed size/mtime/inode since the cache was saved are rehashed.
+    Without a `folder` the hashes are taken from the cache as is (e.g. a cache copied from a remote machine).
+    """
+    cache = load_cache(cache_filename) if cache_filename else {}
+
+    if not folder:
+        return {entry[3]: relative for relative, entry in cache.items()}
+
+    file_dict = func_hasher(folder, cache=cache)
+
     if cache_filename:
-        try:
-            with open(cache_filename, 'r') as f:
-                file_dict = data_load(f)
-            log.info('Loaded data from cache - {0}'.format(cache_filename))
-        except IOError:
-            pass
-        except Exception:
-            log.warn('cache file is corrupted - removing {0}'.format(cache_filename))
-            os.remove(cache_filename)
-
-    if not file_dict:
-        file_dict = func_hasher(folder)
-
-        if cache_filename:
-            with open(cache_filename, 'w') as f:
-                data_dump(file_dict, f)
-            log.info('Saving cache data - {0}'.format(cache_filename))
+        save_cache(cache_filename, cache)
 
     return file_dict
 
 
-def move_files(file_dict_remote, destination_folder, cache_filename, func_hasher, func_move=shutil.move):
+TEMP_FILENAME_FORMAT = '.hash_mover.{0}.{1}'
+
+def plan_moves(file_dict_remote, file_dict_local):
+    """
+    return an ordered list of (source, destination) relative renames that make the local
+    files match the remote layout.
+
+    The renames form a graph (source -> destination). A move is ready when its destination is
+    not the source of a pending move. Ready moves are grouped by destination folder so each
+    folder is visited once at a time. When only cycles remain, one file of the cycle is renamed
+    to a temporary name to break it.
+    Moves onto a local file that is not itself moving are dropped (that would destroy data).
+    The plan is deterministic (sorted), so a `dry_run` lists the same moves a later real run performs.
+
+    >>> plan_moves({'h1': 'b', 'h2': 'a'}, {'h1': 'a', 'h2': 'b'})
+    [('a', '.hash_mover.0.a'), ('b', 'a'), ('.hash_mover.0.a', 'b')]
+    >>> plan_moves({'h1': 'x/b', 'h2': 'x/c'}, {'h1': 'a', 'h2': 'x/b'})
+    [('x/b', 'x/c'), ('a', 'x/b')]
+    >>> plan_moves({'h1': 'b', 'h2': 'c'}, {'h1': 'a', 'h2': 'b', 'h3': 'c'})
+    []
+    """
+    local_paths = set(file_dict_local.values())
+    pending = {
+        file_dict_local[key]: file_dict_remote[key]
+        for key in sorted(file_dict_remote.keys() & file_dict_local.keys())
+        if file_dict_local[key] != file_dict_remote[key]
+    }
+
+    # Drop moves onto files that will still be there (possibly cascading down a chain)
+    blocked = [source for source, destination in pending.items() if destination in local_paths and destination not in pending]
+    while blocked:
+        source = blocked.pop()
+        log.warning('Not moving {0} - {1} already exists'.format(source, pending.pop(source)))
+        blocked += [_source for _source, destination in pending.items() if destination == source]
+
+    incoming = {destination: source for source, destination in pending.items()}
+    ready = defaultdict(list)
+    def _add_ready(source):
+        ready[os.path.dirname(pending[source])].append(source)
+    for source, destination in pending.items():
+        if destination not in pending:
+            _add_ready(source)
+
+    moves = []
+    temp_count = 0
+    while pending:
+        if not ready:
+            # Everything left is part of a cycle
+            source = min(pending)
+            temp = os.path.join(os.path.dirname(source), TEMP_FILENAME_FORMAT.format(temp_count, os.path.basename(source)))
+            temp_count += 1
+            moves.append((source, temp))
+            pending[temp] = pending.pop(source)
+            incoming[pending[temp]] = temp
+            if source in incoming:
+                _add_ready(incoming.pop(source))
+            continue
+        for source in sorted(ready.pop(min(ready))):
+            destination = pending.pop(source)
+            moves.append((source, destination))
+            if source in incoming:
+                _add_ready(incoming.pop(source))
+    return moves
+
+
+def _rename_cache(cache_filename, moves):
+    cache = load_cache(cache_filename)
+    for source, destination in moves:
+        if source in cache:
+            cache[destination] = cache.pop(source)
+    save_cache(cache_filename, cache)
+
+
+def move_files(file_dict_remote, destination_folder, cache_filename, func_hasher, func_move=shutil.move, dry_run=False):
     assert file_dict_remote
     assert destination_folder
     assert func_hasher
 
     file_dict_local = hash_files_cache(destination_folder, cache_filename, func_hasher)
 
-    for key in file_dict_remote.keys() & file_dict_local.keys():
-        if file_dict_local[key] != file_dict_remote[key]:
-            source_file = os.path.join(destination_folder, file_dict_local[key])
-            destination_file = os.path.join(destination_folder, file_dict_remote[key])
+    moves = plan_moves(file_dict_remote, file_dict_local)
+    if dry_run:
+        for source, destination in moves:
+            log.info('Move {0} to {1}'.format(source, destination))
+        return moves
+
+    done = []
+    created_paths = set()
+    for source, destination in moves:
+        source_file = os.path.join(destination_folder, source)
+        destination_file = os.path.join(destination_folder, destination)
+
+        # Create destination folders if needed (once per folder)
+        destination_path = os.path.dirname(destination_file)
+        if destination_path not in created_paths:
+            os.makedirs(destination_path, exist_ok=True)
+            created_paths.add(destination_path)
+
+        # The local hash dict only holds one path per hash, so files not known to the plan may exist
+        if os.path.lexists(destination_file):
+            log.warning('Not moving {0} - {1} already exists'.format(source, destination))
+            continue
 
-            # Create destination folders if needed
-            destination_path = os.path.dirname(destination_file)
-            if not os.path.exists(destination_path):
-                os.makedirs(destination_path)
+        func_move(source_file, destination_file)
+        done.append((source, destination))
 
-            func_move(source_file, destination_file)
+    if cache_filename and done:
+        _rename_cache(cache_filename, done)
+    return done
 
 
 #to_delete = open('/Users/allan.callaghan/Applications/KaraKara/to_delete.txt', 'a')
@@ -284,6 +470,10 @@ def get_args():
     parser.add_argument('--file_regex', action='store', help='', default=DEFAULT_FILE_REGEX)
     parser.add_argument('--ignore_regex', action='store', help='', default=DEFAULT_IGNORE_REGEX)
 
+    # Hashing
+    parser.add_argument('--workers', action='store', type=int, help='number of threads reading/hashing files in parallel', default=DEFAULT_WORKERS)
+    parser.add_argument('--blocksize', action='store', type=int, help='bytes read per hash update', default=DEFAULT_BLOCKSIZE)
+
     # Common
     parser.add_argument('--dry_run', action='store_true', help='', default=False)
     parser.add_argument('-v', '--verbose', action='store_true', help='', default=False)
@@ -298,12 +488,9 @@ def main():
     args = get_args()
     logging.basicConfig(level=logging.DEBUG if args['verbose'] else logging.INFO)
 
-    func_hasher = partial(hash_files, file_regex=args['file_regex'], ignore_regex=args['ignore_regex'])
+    func_hasher = partial(hash_files, file_regex=args['file_regex'], ignore_regex=args['ignore_regex'], workers=args['workers'], blocksize=args['blocksize'])
     hash_files_dict = None
 
-    if args['dry_run']:
-        log.warn('dry_run is not implemented properly, it still creates folders')
-
     if args.get('delete_duplicates'):
         remove_duplicates(args.get('source_folder'), file_regex=args['file_regex'], ignore_regex=args['ignore_regex'])
         exit()
@@ -314,8 +501,7 @@ def main():
     if args.get('destination_folder'):
         if not hash_files_dict:
             hash_files_dict = json.load(sys.stdin)
-        func_move = (lambda source, destination: log.info('Move {0} to {1}'.format(source, destination))) if args['dry_run'] else shutil.move
-        move_files(hash_files_dict, args['destination_folder'], args['cache_filename_destination'], func_hasher, func_move)
+        move_files(hash_files_dict, args['destination_folder'], args['cache_filename_destination'], func_hasher, dry_run=args['dry_run'])
     else:
         json.dump(hash_files_dict, sys.stdout)
         sys.stdout.flush()
@@ -1,11 +1,43 @@
 import struct
 from collections import namedtuple
+from operator import attrgetter
 import os.path
 import tempfile
+import mmap
+import zlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 import logging
 log = logging.getLogger(__name__)
 
+
+def _call(func, value):
+    return func(value)
+
+
+def _tuple_attrgetter(names):
+    """
+    `attrgetter` that always returns a tuple (even for zero or one attribute names)
+
+    >>> _tuple_attrgetter(('real', ))(1)
+    (1,)
+    >>> _tuple_attrgetter(('real', 'imag'))(1)
+    (1, 0)
+    >>> _tuple_attrgetter(())(1)
+    ()
+    """
+    if not names:
+        return lambda obj: ()
+    if len(names) == 1:
+        getter = attrgetter(*names)
+        return lambda obj: (getter(obj), )
+    return attrgetter(*names)
+
+
 class BasePackerMixin(object):
     pass
 
@@ -13,6 +45,7 @@ class BasePackerMixin(object):
 class AttributePackerMixin(BasePackerMixin):
     Attribute = namedtuple('Attribute', ('name', 'type'))
     AttributeEncoder = namedtuple('AttributeEncoder', ('encode', 'decode', 'fmt'))
+    PackLayout = namedtuple('PackLayout', ('struct', 'names', 'getter', 'encoders', 'decoders'))
     AttributeEncoders = {
         'byte': AttributeEncoder(
             lambda value: value,
@@ -47,7 +80,44 @@ class AttributePackerMixin(BasePackerMixin):
         if not hasattr(self, '_pack_attributes'):
             self._pack_attributes = tuple()
         self._pack_attributes += attributes
-        self.pack_size = sum(struct.calcsize(self.AttributeEncoders[attribute.type].fmt) for attribute in self._pack_attributes)
+        self._pack_layout = self._get_pack_layout(self._pack_attributes)
+        self.pack_size = self._pack_layout.struct.size
+
+    @classmethod
+    def _get_pack_layout(cls, attributes):
+        r"""
+        Compile a tuple of Attributes into a single `struct.Struct` with the encode/decode functions in field order.
+        Layouts are cached per class, so thousands of objects with the same attributes share one compiled layout.
+
+        >>> layout = _TestAttributePacker._get_pack_layout(_TestAttributePacker()._pack_attributes)
+        >>> layout.struct.format
+        '=BB'
+        >>> layout.names
+        ('a', 'b')
+        >>> layout is _TestAttributePacker()._pack_layout
+        True
+        """
+        cache = cls.__dict__.get('_pack_layout_cache')
+        if cache is None:
+            cache = {}
+            cls._pack_layout_cache = cache
+        layout = cache.get(attributes)
+        if not layout:
+            encoders = tuple(cls.AttributeEncoders[attribute.type] for attribute in attributes)
+            names = tuple(attribute.name for attribute in attributes)
+            for attribute, encoder in zip(attributes, encoders):
+                # '=' uses standard sizes. Native size codes (e.g. 'l' is 8 bytes natively, 4 standard) would change the packed bytes
+                assert struct.calcsize(encoder.fmt) == struct.calcsize('=' + encoder.fmt), f"attribute '{attribute.name}' format '{encoder.fmt}' has a native size that differs from its standard size. Use a standard size format"
+            layout = cls.PackLayout(
+                # '=' -> native byte order with standard sizes and no alignment padding between fields
+                struct=struct.Struct('=' + ''.join(encoder.fmt for encoder in encoders)),
+                names=names,
+                getter=_tuple_attrgetter(names),
+                encoders=tuple(encoder.encode for encoder in encoders),
+                decoders=tuple(encoder.decode for encoder in encoders),
+            )
+            cache[attributes] = layout
+        return layout
 
     def pack(self, buffer, offset):
         r"""
@@ -59,13 +129,9 @@ class AttributePackerMixin(BasePackerMixin):
         bytearray(b'\x01\x10\x7f\x04')
 
         """
-        for value, encoder in (
-                (getattr(self, attribute_name), self.AttributeEncoders[attribute_type])
-                for attribute_name, attribute_type in self._pack_attributes
-        ):
-            struct.pack_into(encoder.fmt, buffer, offset, encoder.encode(value))
-            offset += struct.calcsize(encoder.fmt)
-        return offset
+        layout = self._pack_layout
+        layout.struct.pack_into(buffer, offset, *map(_call, layout.encoders, layout.getter(self)))
+        return offset + layout.struct.size
 
     def unpack(self, buffer, offset):
         r"""
@@ -78,14 +144,10 @@ class AttributePackerMixin(BasePackerMixin):
         >>> assert (obj.b - 0.5) < 0.01
 
         """
-        for attribute_name, encoder in (
-                (attribute_name, self.AttributeEncoders[attribute_type])
-                for attribute_name, attribute_type in self._pack_attributes
-        ):
-            value, = struct.unpack_from(encoder.fmt, buffer, offset)
-            offset += struct.calcsize(encoder.fmt)
-            setattr(self, attribute_name, encoder.decode(value))
-        return offset
+        layout = self._pack_layout
+        for attribute_name, value in zip(layout.names, map(_call, layout.decoders, layout.struct.unpack_from(buffer, offset))):
+            setattr(self, attribute_name, value)
+        return offset + layout.struct.size
 
 
 class CollectionPackerMixin(BasePackerMixin):
@@ -121,6 +183,128 @@ class CollectionPackerMixin(BasePackerMixin):
         return offset
 
 
+class ColumnarCollectionPackerMixin(CollectionPackerMixin):
+    """
+    Opt-in alternative to CollectionPackerMixin for collections where every item shares the same attribute schema.
+    The whole collection is gathered into columns (struct-of-arrays), encoded with vectorised numpy transforms
+    and written directly into the target buffer through a structured numpy view (no per-item struct calls).
+    Without numpy, or when items use attribute types that have no `ColumnEncoders` equivalent
+(e.g. a subclass with custom `AttributeEncoders`), this falls back to the CollectionPackerMixin per-item path (same bytes).
+
+    Note: Like the numpy casts themselves, out of range values are not checked (struct.error is not raised)
+    """
+    ColumnEncoder = namedtuple('ColumnEncoder', ('encode', 'decode'))
+    ColumnEncoders = {
+        'byte': ColumnEncoder(
+            lambda column: column,
+            lambda column: column,
+        ),
+        'onebyte': ColumnEncoder(
+            lambda column: column * 255,
+            lambda column: column / 255,
+        ),
+        'plusminusonebyte': ColumnEncoder(
+            lambda column: ((column + 1) / 2) * 255,
+            lambda column: ((column / 255) * 2) - 1,
+        ),
+    }
+
+    def __init__(self, pack_collection):
+        r"""
+        >>> _TestColumnarPackerCollection((_TestAttributePacker(), _TestAttributePacker())).pack_size
+        4
+
+        Items must have identical attributes (names and types)
+        >>> class _OneByteTestAttributePacker(AttributePackerMixin):
+        ...     def __init__(self):
+        ...         self.a = self.b = 0
+        ...         AttributePackerMixin.__init__(self, (AttributePackerMixin.Attribute('a', 'onebyte'), AttributePackerMixin.Attribute('b', 'onebyte')))
+        >>> try:
+        ...     _TestColumnarPackerCollection((_TestAttributePacker(), _OneByteTestAttributePacker()))
+        ... except AssertionError:
+        ...     print('AssertionError')
+        AssertionError
+
+        Custom attribute types use the per-item path
+        >>> class _CustomTestAttributePacker(AttributePackerMixin):
+        ...     AttributeEncoders = dict(AttributePackerMixin.AttributeEncoders, half=AttributePackerMixin.AttributeEncoder(lambda v: int(v * 2), lambda v: v / 2, 'B'))
+        ...     def __init__(self, a=0):
+        ...         self.a = a
+        ...         AttributePackerMixin.__init__(self, (AttributePackerMixin.Attribute('a', 'half'), ))
+        >>> collection = _TestColumnarPackerCollection((_CustomTestAttributePacker(4), ))
+        >>> collection._pack_columns is None
+        True
+        >>> buffer = bytearray(1)
+        >>> collection.pack(buffer, 0)
+        1
+        >>> buffer
+        bytearray(b'\x08')
+        """
+        super().__init__(pack_collection)
+        layouts = {
+            (item._pack_attributes, id(item.AttributeEncoders)) if isinstance(item, AttributePackerMixin) else None
+            for item in pack_collection
+        }
+        assert None not in layouts and len(layouts) <= 1, 'columnar collections must contain only `AttributePackerMixin` items with identical attributes'
+        self._pack_columns = None
+        if pack_collection and np and all(
+            attribute_type in self.ColumnEncoders and pack_collection[0].AttributeEncoders[attribute_type] is AttributePackerMixin.AttributeEncoders[attribute_type]
+            for _, attribute_type in pack_collection[0]._pack_attributes
+        ):
+            item = pack_collection[0]
+            layout = item._pack_layout
+            self._pack_columns = tuple(
+                (name, self.ColumnEncoders[attribute_type])
+                for name, attribute_type in item._pack_attributes
+            )
+            self._pack_getter = layout.getter
+            self._pack_dtype = np.dtype([
+                (name, '=' + item.AttributeEncoders[attribute_type].fmt)
+                for name, attribute_type in item._pack_attributes
+            ])
+            assert self._pack_dtype.itemsize == layout.struct.size
+
+    def _frame_view(self, buffer, offset):
+        return np.frombuffer(buffer, dtype=self._pack_dtype, count=len(self._pack_collection), offset=offset)
+
+    def pack(self, buffer, offset):
+        r"""
+        >>> collection = _TestColumnarPackerCollection((_TestAttributePacker(16, 0.5), _TestAttributePacker(24, 1.0)))
+        >>> buffer = bytearray(6)
+        >>> collection.pack(buffer, 1)
+        5
+        >>> buffer
+        bytearray(b'\x00\x10\x7f\x18\xff\x00')
+        """
+        if not self._pack_columns:
+            return super().pack(buffer, offset)
+        values = np.array(tuple(map(self._pack_getter, self._pack_collection)), dtype=np.float64)
+        frame = self._frame_view(buffer, offset)
+        for index, (name, encoder) in enumerate(self._pack_columns):
+            frame[name] = encoder.encode(values[:, index])
+        return offset + self.pack_size
+
+    def unpack(self, buffer, offset):
+        r"""
+        >>> obj1, obj2 = _TestAttributePacker(), _TestAttributePacker()
+        >>> collection = _TestColumnarPackerCollection((obj1, obj2))
+        >>> collection.unpack(bytearray(b'\x00\x10\x7f\x18\xff\x00'), 1)
+        5
+        >>> (obj1.a, obj2.a, obj2.b)
+        (16, 24, 1.0)
+        >>> assert (obj1.b - 0.5) < 0.01
+        """
+        if not self._pack_columns:
+            return super().unpack(buffer, offset)
+        frame = self._frame_view(buffer, offset)
+        names = tuple(name for name, _ in self._pack_columns)
+        rows = zip(*(encoder.decode(frame[name]).tolist() for name, encoder in self._pack_columns))
+        for item, row in zip(self._pack_collection, rows):
+            for name, value in zip(names, row):
+                setattr(item, name, value)
+        return offset + self.pack_size
+
+
 # Frame Persistence ------------------------------------------------------------
 
 class BaseFramePacker(object):
@@ -163,15 +347,37 @@ class BaseFramePacker(object):
 
 
 class MemoryFramePacker(BaseFramePacker):
-    def __init__(self, packer_collection):
+    """
+    Frames are recorded into a preallocated `bytearray` that grows in chunks (doubling capacity),
+    so appending frames is amortised O(1). `_byte_size` is the recorded portion of `_buffer`.
+    """
+    DEFAULT_CHUNK_FRAMES = 256
+
+    def __init__(self, packer_collection, chunk_frames=DEFAULT_CHUNK_FRAMES):
         super().__init__(packer_collection)
+        assert chunk_frames > 0
+        self.chunk_size = chunk_frames * self.frame_size
         self._buffer = bytearray()
+        self._byte_size = 0
 
     def _get_byte_size(self):
-        return len(self._buffer)
+        return self._byte_size
 
-    def save_frame(self, frame_number=None, insert=True):
+    def _reserve(self, byte_size):
+        if len(self._buffer) < byte_size:
+            self._buffer.extend(bytearray(max(byte_size - len(self._buffer), len(self._buffer), self.chunk_size)))
+
+    def getbuffer(self):
+        """
+        Zero-copy `memoryview` of the recorded frames (release it before recording more frames)
+        """
+        return memoryview(self._buffer)[:self._byte_size]
+
+    def save_frame(self, frame_number=None, insert=False):
         r"""
+        Append a new frame or overwrite an existing frame in place.
+        `insert=True` shifts existing frames from `frame_number` onwards (O(n))
+
         >>> obj1 = _TestAttributePacker()
         >>> obj2 = _TestAttributePacker()
         >>> mp = MemoryFramePacker(_TestPackerCollection((obj1, obj2)))
@@ -181,12 +387,27 @@ class MemoryFramePacker(BaseFramePacker):
         >>> obj2.a = 24
         >>> obj2.b = 0
         >>> mp.save_frame()
-        >>> mp._buffer
-        bytearray(b'\x00\x00\x00\x00\x10\x7f\x18\x00')
+        >>> bytes(mp.getbuffer())
+        b'\x00\x00\x00\x00\x10\x7f\x18\x00'
+        >>> obj1.a = 8
+        >>> mp.save_frame(0)
+        >>> bytes(mp.getbuffer())
+        b'\x08\x7f\x18\x00\x10\x7f\x18\x00'
+        >>> obj1.a = 4
+        >>> mp.save_frame(1, insert=True)
+        >>> bytes(mp.getbuffer())
+        b'\x08\x7f\x18\x00\x04\x7f\x18\x00\x10\x7f\x18\x00'
+        >>> mp.frames
+        3
         """
         frame = self._get_frame_details(frame_number)
-        if insert:
-            self._buffer[frame.pos:frame.pos] += bytearray(frame.size)
+        if insert and frame.pos < self._byte_size:
+            self._reserve(self._byte_size + frame.size)
+            self._buffer[frame.pos + frame.size:self._byte_size + frame.size] = self._buffer[frame.pos:self._byte_size]
+            self._byte_size += frame.size
+        else:
+            self._reserve(frame.pos + frame.size)
+            self._byte_size = max(self._byte_size, frame.pos + frame.size)
         offset = self._top_level_packer_collection.pack(self._buffer, frame.pos)
         assert offset - frame.pos == frame.size, 'Should have written the exact frame.size of bytes'
 
@@ -196,6 +417,7 @@ class MemoryFramePacker(BaseFramePacker):
         >>> obj2 = _TestAttributePacker()
         >>> mp = MemoryFramePacker(_TestPackerCollection((obj1, obj2)))
         >>> mp._buffer = bytearray(b'\x00\x00\x00\x00' + b'\x10\x7f' + b'\x18\x00')
+        >>> mp._byte_size = len(mp._buffer)
         >>> mp.restore_frame(1)
         >>> obj1.a
         16
@@ -206,11 +428,52 @@ class MemoryFramePacker(BaseFramePacker):
         offset = self._top_level_packer_collection.unpack(self._buffer, frame.pos)
         assert offset - frame.pos == frame.size, 'Should have read the exact frame.size of bytes'
 
+    def save_to_file(self, filename):
+        r"""
+        Write the recorded frames (without an intermediate copy) to a file readable by `PersistentFramePacker`
+
+        >>> import os
+        >>> filename = os.path.join(tempfile.mkdtemp(), 'frames')
+        >>> obj = _TestAttributePacker()
+        >>> mp = MemoryFramePacker(_TestPackerCollection((obj, )))
+        >>> for a in range(3):
+        ...     obj.a = a
+        ...     mp.save_frame()
+        >>> pp = mp.save_to_file(filename)
+        >>> pp.frames
+        3
+        >>> pp.restore_frame(1)
+        >>> obj.a
+        1
+        >>> pp.close()
+        >>> os.remove(filename); os.rmdir(os.path.dirname(filename))
+        """
+        with open(filename, 'wb') as filehandle, self.getbuffer() as recorded:
+            filehandle.write(recorded)
+        return PersistentFramePacker(self._top_level_packer_collection, filename=filename)
+
     def close(self):
         self._buffer[:] = bytearray()
+        self._byte_size = 0
+
+
+class FileHandlerMixin(object):
+    """
+    Lazily opened binary file `handler` for `self.filename` (a temporary file if there is no filename)
+    """
+    @property
+    def handler(self):
+        if not self._handler:
+            if self.filename:
+                log.debug(f'Open {self.filename}')
+                self._handler = open(self.filename, 'r+b' if os.path.isfile(self.filename) else 'w+b')
+            else:
+                log.debug(f'Open [tempfile]')
+                self._handler = tempfile.TemporaryFile(mode='w+b')
+        return self._handler
 
 
-class PersistentFramePacker(BaseFramePacker):
+class PersistentFramePacker(FileHandlerMixin, BaseFramePacker):
     def __init__(self, packer_collection, filename=None):
         super().__init__(packer_collection)
         self.filename = filename
@@ -225,32 +488,29 @@ class PersistentFramePacker(BaseFramePacker):
     def _get_byte_size(self):
         return self._byte_size
 
-    @property
-    def handler(self):
-        if not self._handler:
-            if self.filename:
-                log.debug(f'Open {self.filename}')
-                self._handler = open(self.filename, 'r+b' if os.path.isfile(self.filename) else 'w+b')
-            else:
-                log.debug(f'Open [tempfile]')
-                self._handler = tempfile.TemporaryFile(mode='w+b')
-        return self._handler
-
     def close(self, truncate_to_current_file_position_on_close=True):
         if self._handler:
             if self._has_been_modified and truncate_to_current_file_position_on_close and self.frames > self.current_frame and self._handler.tell():
                 log.debug(f'Existing persistant file has {self.frames} frames. Current frame is {self.current_frame}. {self.filename} will be truncated.')
-                self._handler.truncate()
+                self._byte_size = self._handler.truncate()
             self._handler.close()
             self._handler = None
 
     def save_frame(self, frame_number=None):
+        r"""
+        >>> pp = PersistentFramePacker(_TestPackerCollection((_TestAttributePacker(), )))
+        >>> pp.save_frame(); pp.save_frame(); pp.frames
+        2
+        >>> pp.save_frame(0); pp.frames
+        2
+        >>> pp.close()
+        """
         frame = self._get_frame_details(frame_number)
         self.handler.seek(frame.pos)
         self._top_level_packer_collection.pack(self._buffer, 0)
         self.handler.write(self._buffer)
         self._has_been_modified = True
-        # TODO: increment self._byte_size?
+        self._byte_size = max(self._byte_size, frame.pos + frame.size)
 
     def restore_frame(self, frame_number=None):
         frame = self._get_frame_details(frame_number)
@@ -259,6 +519,364 @@ class PersistentFramePacker(BaseFramePacker):
         self._top_level_packer_collection.unpack(self.handler.read(frame.size), 0)
 
 
+
+class MemoryMappedFramePacker(FileHandlerMixin, BaseFramePacker):
+    """
+    File backed frame store (same file format as PersistentFramePacker) accessed through `mmap`.
+    Frames are packed/unpacked directly in the mapped memory, so seeking/scrubbing does not cost a syscall per frame.
+    The file is grown in extents of `extent_frames` frames and truncated back to the recorded frames on close.
+    """
+    DEFAULT_EXTENT_FRAMES = 1024
+
+    def __init__(self, packer_collection, filename=None, extent_frames=DEFAULT_EXTENT_FRAMES):
+        super().__init__(packer_collection)
+        assert extent_frames > 0
+        self.filename = filename
+        self.extent_size = extent_frames * self.frame_size
+        self._byte_size = 0
+        if filename and os.path.exists(filename):
+            self._byte_size = os.stat(filename).st_size
+            log.debug(f'Attach to existing packer with {self.frames} frames')
+        self._handler = None
+        self._mmap = None
+        self._has_been_modified = False
+
+    def _get_byte_size(self):
+        return self._byte_size
+
+    def _map(self, byte_size):
+        """
+        Ensure at least `byte_size` bytes of the file are mapped.
+        Growing remaps the file, so any `frame_view` memoryviews must have been released.
+        """
+        if self._mmap is not None and len(self._mmap) >= byte_size:
+            return self._mmap
+        file_size = os.fstat(self.handler.fileno()).st_size
+        if file_size < byte_size:
+            file_size = -(-byte_size // self.extent_size) * self.extent_size
+            self.handler.truncate(file_size)
+        if self._mmap is not None:
+            self._mmap.close()
+        self._mmap = mmap.mmap(self.handler.fileno(), file_size)
+        return self._mmap
+
+    def frame_view(self, frame_number):
+        r"""
+        Zero-copy `memoryview` of a recorded frame's bytes (release it before recording beyond the current extent)
+
+        >>> obj = _TestAttributePacker()
+        >>> mp = MemoryMappedFramePacker(_TestPackerCollection((obj, )), extent_frames=2)
+        >>> obj.a = 16
+        >>> mp.save_frame()
+        >>> obj.a = 24
+        >>> mp.save_frame()
+        >>> with mp.frame_view(1) as view:
+        ...     view.tobytes()
+        b'\x18\x00'
+        >>> mp.close()
+        """
+        assert 0 <= frame_number < self.frames, f'frame {frame_number} has not been recorded'
+        pos = frame_number * self.frame_size
+        return memoryview(self._map(self._byte_size))[pos:pos + self.frame_size]
+
+    def save_frame(self, frame_number=None):
+        r"""
+        >>> obj = _TestAttributePacker()
+        >>> mp = MemoryMappedFramePacker(_TestPackerCollection((obj, )), extent_frames=2)
+        >>> for a in range(5):
+        ...     obj.a = a
+        ...     mp.save_frame()
+        >>> mp.frames
+        5
+        >>> len(mp._mmap)
+        12
+        >>> mp.restore_frame(3)
+        >>> obj.a
+        3
+        >>> mp.close()
+        """
+        frame = self._get_frame_details(frame_number)
+        offset = self._top_level_packer_collection.pack(self._map(frame.pos + frame.size), frame.pos)
+        assert offset - frame.pos == frame.size, 'Should have written the exact frame.size of bytes'
+        self._has_been_modified = True
+        self._byte_size = max(self._byte_size, frame.pos + frame.size)
+
+    def restore_frame(self, frame_number=None):
+        r"""
+        >>> obj = _TestAttributePacker()
+        >>> mp = MemoryMappedFramePacker(_TestPackerCollection((obj, )), extent_frames=2)
+        >>> mp.save_frame()
+        >>> try:
+        ...     mp.restore_frame(1)
+        ... except AssertionError:
+        ...     print('AssertionError')
+        AssertionError
+        >>> len(mp._mmap)
+        4
+        >>> mp.close()
+        """
+        frame = self._get_frame_details(frame_number)
+        assert frame.number < self.frames, f'frame {frame.number} has not been recorded'
+        offset = self._top_level_packer_collection.unpack(self._map(frame.pos + frame.size), frame.pos)
+        assert offset - frame.pos == frame.size, 'Should have read the exact frame.size of bytes'
+
+    def close(self, truncate_to_current_frame_on_close=True):
+        r"""
+        The file is truncated to the recorded frames (removing unused extent space)
+
+        >>> import os
+        >>> filename = os.path.join(tempfile.mkdtemp(), 'frames')
+        >>> obj = _TestAttributePacker()
+        >>> mp = MemoryMappedFramePacker(_TestPackerCollection((obj, )), filename=filename)
+        >>> for a in range(3):
+        ...     obj.a = a
+        ...     mp.save_frame()
+        >>> mp.close()
+        >>> os.stat(filename).st_size
+        6
+        >>> mp = MemoryMappedFramePacker(_TestPackerCollection((obj, )), filename=filename)
+        >>> mp.frames
+        3
+        >>> mp.restore_frame(1)
+        >>> obj.a
+        1
+        >>> mp.close()
+        >>> os.stat(filename).st_size
+        6
+        >>> os.remove(filename); os.rmdir(os.path.dirname(filename))
+        """
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._handler:
+            if self._has_been_modified and truncate_to_current_frame_on_close and self.frames > self.current_frame:
+                log.debug(f'Existing persistant file has {self.frames} frames. Current frame is {self.current_frame}. {self.filename} will be truncated.')
+                self._byte_size = self.current_frame * self.frame_size
+            self._handler.truncate(self._byte_size)
+            self._handler.close()
+            self._handler = None
+
+
+
+def _xor_bytes(a, b):
+    r"""
+    >>> _xor_bytes(b'\x01\x02\xff', b'\x01\x03\x0f')
+    b'\x00\x01\xf0'
+    """
+    return (int.from_bytes(a, 'little') ^ int.from_bytes(b, 'little')).to_bytes(len(a), 'little')
+
+
+class CompressedFramePacker(FileHandlerMixin, BaseFramePacker):
+    """
+    Compact file format for long recordings where frames change little from one frame to the next.
+
+    Frames are grouped into blocks of `keyframe_interval` frames.
+    The first frame of a block is a raw keyframe, the following frames are XOR'ed against that keyframe
+    (unchanged bytes become zeros) and the whole block is zlib compressed.
+    A block index (file position per block) is kept in memory, so restoring any frame costs
+    at most one seek + read + decompress; the most recently decoded block is cached for scrubbing.
+
+    File layout: FileHeader, then per block: BlockHeader + compressed block data
+
+    Frames are recorded append-only. Frames in the current (not yet compressed) block can be overwritten.
+    """
+    FileHeader = struct.Struct('<4sII')  # magic, frame_size, keyframe_interval
+    BlockHeader = struct.Struct('<II')  # frames in block, compressed size
+    MAGIC = b'CFP1'
+    DEFAULT_KEYFRAME_INTERVAL = 64
+    BlockDetails = namedtuple('BlockDetails', ('pos', 'frames', 'size'))
+
+    def __init__(self, packer_collection, filename=None, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, compression_level=zlib.Z_DEFAULT_COMPRESSION):
+        super().__init__(packer_collection)
+        assert keyframe_interval > 0
+        self.filename = filename
+        self.keyframe_interval = keyframe_interval
+        self.compression_level = compression_level
+        self._handler = None
+        self._index = []
+        self._pending = bytearray()  # current block: keyframe + xor'ed frames (uncompressed)
+        self._partial_block = None  # on disk copy of `_pending`, until the block is appended to
+        self._decoded = (None, None)  # (block number, decoded bytes)
+        self._buffer = bytearray(self.frame_size)
+        if filename and os.path.exists(filename) and os.stat(filename).st_size:
+            self._read_index()
+            log.debug(f'Attach to existing packer with {self.frames} frames')
+        else:
+            self.handler.write(self.FileHeader.pack(self.MAGIC, self.frame_size, self.keyframe_interval))
+
+    def _read_index(self):
+        self.handler.seek(0)
+        magic, frame_size, self.keyframe_interval = self.FileHeader.unpack(self.handler.read(self.FileHeader.size))
+        assert magic == self.MAGIC, f'{self.filename} is not a compressed frame file'
+        assert frame_size == self.frame_size, f'{self.filename} frame_size {frame_size} does not match packer frame_size {self.frame_size}'
+        while True:
+            pos = self.handler.tell()
+            header = self.handler.read(self.BlockHeader.size)
+            if len(header) < self.BlockHeader.size:
+                break
+            frames, size = self.BlockHeader.unpack(header)
+            self._index.append(self.BlockDetails(pos, frames, size))
+            self.handler.seek(size, os.SEEK_CUR)
+        self._reopen_partial_block()
+
+    def _reopen_partial_block(self):
+        """
+        A partial last block (written by `close()`) is moved back to `_pending` for appending,
+        so every indexed block except the last is always a full `keyframe_interval` of frames.
+        The block stays on disk until `save_frame` changes it.
+        """
+        if self._index and self._index[-1].frames < self.keyframe_interval:
+            assert not self._pending
+            self._partial_block = self._index.pop()
+            self.handler.seek(self._partial_block.pos + self.BlockHeader.size)
+            self._pending[:] = zlib.decompress(self.handler.read(self._partial_block.size))
+            if self._decoded[0] == len(self._index):
+                self._decoded = (None, None)
+
+    def _get_byte_size(self):
+        return sum(block.frames for block in self._index) * self.frame_size + len(self._pending)
+
+    def _flush(self):
+        if not self._pending:
+            return
+        if self._partial_block:
+            # Unchanged since it was read from disk
+            self._index.append(self._partial_block)
+            self._partial_block = None
+            self._pending.clear()
+            return
+        data = zlib.compress(self._pending, self.compression_level)
+        self.handler.seek(0, os.SEEK_END)
+        block = self.BlockDetails(self.handler.tell(), len(self._pending) // self.frame_size, len(data))
+        self.handler.write(self.BlockHeader.pack(block.frames, block.size))
+        self.handler.write(data)
+        self._index.append(block)
+        self._pending.clear()
+
+    def _decode_block(self, block_number):
+        if self._decoded[0] != block_number:
+            block = self._index[block_number]
+            self.handler.seek(block.pos + self.BlockHeader.size)
+            self._decoded = (block_number, self._decode(zlib.decompress(self.handler.read(block.size))))
+        return self._decoded[1]
+
+    def _decode(self, encoded):
+        keyframe = encoded[:self.frame_size]
+        return b''.join((keyframe, *(
+            _xor_bytes(encoded[pos:pos + self.frame_size], keyframe)
+            for pos in range(self.frame_size, len(encoded), self.frame_size)
+        )))
+
+    def save_frame(self, frame_number=None):
+        r"""
+        >>> obj = _TestAttributePacker()
+        >>> cp = CompressedFramePacker(_TestPackerCollection((obj, )), keyframe_interval=4)
+        >>> for a in range(10):
+        ...     obj.a = a
+        ...     cp.save_frame()
+        >>> cp.frames
+        10
+        >>> len(cp._index), bytes(cp._pending)
+        (2, b'\x08\x00\x01\x00')
+        >>> cp.restore_frame(5)
+        >>> obj.a
+        5
+        >>> cp.restore_frame(9)
+        >>> obj.a
+        9
+
+        Overwriting the keyframe of the current block re-encodes the later frames of the block
+        >>> obj.a = 20
+        >>> cp.save_frame(8)
+        >>> cp.frames
+        10
+        >>> cp.restore_frame(9)
+        >>> obj.a
+        9
+        >>> cp.close()
+        """
+        frame = self._get_frame_details(frame_number)
+        self._reopen_partial_block()
+        block_start = len(self._index) * self.keyframe_interval
+        assert block_start <= frame.number <= self.frames, f'frame {frame.number} can not be recorded. Compressed frames can only be appended from frame {block_start}'
+        if self._partial_block:
+            self.handler.seek(self._partial_block.pos)
+            self.handler.truncate()
+            self._partial_block = None
+        self._top_level_packer_collection.pack(self._buffer, 0)
+        pos = frame.pos - block_start * self.frame_size
+        if pos:
+            self._pending[pos:pos + frame.size] = _xor_bytes(self._buffer, self._pending[:self.frame_size])
+        else:
+            # The other frames of the block are re-encoded against the new keyframe
+            decoded = self._decode(self._pending)
+            self._pending[:] = self._buffer
+            for pos in range(frame.size, len(decoded), frame.size):
+                self._pending += _xor_bytes(decoded[pos:pos + frame.size], self._buffer)
+        if len(self._pending) >= self.keyframe_interval * self.frame_size:
+            self._flush()
+
+    def restore_frame(self, frame_number=None):
+        frame = self._get_frame_details(frame_number)
+        assert frame.number < self.frames, f'frame {frame.number} has not been recorded'
+        block_number, block_frame = divmod(frame.number, self.keyframe_interval)
+        if block_number < len(self._index):
+            decoded = self._decode_block(block_number)
+        else:
+            decoded = self._decode(self._pending)
+        self._top_level_packer_collection.unpack(decoded, block_frame * frame.size)
+
+    def close(self):
+        r"""
+        >>> import os
+        >>> filename = os.path.join(tempfile.mkdtemp(), 'frames')
+        >>> obj = _TestAttributePacker(b=0.5)
+        >>> cp = CompressedFramePacker(_TestPackerCollection((obj, )), filename=filename, keyframe_interval=4)
+        >>> for a in range(6):
+        ...     obj.a = a
+        ...     cp.save_frame()
+        >>> cp.close()
+        >>> cp = CompressedFramePacker(_TestPackerCollection((obj, )), filename=filename)
+        >>> cp.keyframe_interval, cp.frames
+        (4, 6)
+
+        Opening a file does not modify it
+        >>> CompressedFramePacker(_TestPackerCollection((obj, )), filename=filename).frames
+        6
+        >>> obj.a = 6
+        >>> cp.save_frame(cp.frames)
+        >>> cp.restore_frame(2)
+        >>> obj.a
+        2
+        >>> cp.close()
+        >>> cp = CompressedFramePacker(_TestPackerCollection((obj, )), filename=filename)
+        >>> cp.frames
+        7
+        >>> cp.restore_frame(6)
+        >>> obj.a
+        6
+
+        A closed packer can be reused. The partial last block is reopened for appending
+        >>> cp.close()
+        >>> cp.frames
+        7
+        >>> obj.a = 7
+        >>> cp.save_frame(cp.frames)
+        >>> cp.frames, len(cp._index)
+        (8, 2)
+        >>> cp.restore_frame(7)
+        >>> obj.a
+        7
+        >>> cp.close()
+        >>> os.remove(filename); os.rmdir(os.path.dirname(filename))
+        """
+        if self._handler:
+            self._flush()
+            self._handler.close()
+            self._handler = None
+        self._decoded = (None, None)
+
+
 # Test Utils -------------------------------------------------------------------
 
 class _TestAttributePacker(AttributePackerMixin):
@@ -274,3 +892,78 @@ class _TestPackerCollection(CollectionPackerMixin):
     def __init__(self, collection):
         self.collection = collection
         CollectionPackerMixin.__init__(self, self.collection)
+
+class _TestColumnarPackerCollection(ColumnarCollectionPackerMixin):
+    def __init__(self, collection):
+        self.collection = collection
+        ColumnarCollectionPackerMixin.__init__(self, self.collection)
+
+
+# Benchmark --------------------------------------------------------------------
+
+def _pack_per_attribute(obj, buffer, offset):
+    """
+    The previous (one `struct.pack_into` per attribute) implementation of `AttributePackerMixin.pack`.
+    Retained as a reference point for `_benchmark`.
+    """
+    for attribute_name, attribute_type in obj._pack_attributes:
+        encoder = obj.AttributeEncoders[attribute_type]
+        struct.pack_into(encoder.fmt, buffer, offset, encoder.encode(getattr(obj, attribute_name)))
+        offset += struct.calcsize(encoder.fmt)
+    return offset
+
+
+def _unpack_per_attribute(obj, buffer, offset):
+    for attribute_name, attribute_type in obj._pack_attributes:
+        encoder = obj.AttributeEncoders[attribute_type]
+        value, = struct.unpack_from(encoder.fmt, buffer, offset)
+        offset += struct.calcsize(encoder.fmt)
+        setattr(obj, attribute_name, encoder.decode(value))
+    return offset
+
+
+def _benchmark(items=1000, repeat=100):
+    """
+    Compare the compiled single `struct.Struct` path with the per-attribute path
+    """
+    import timeit
+
+    class _BenchmarkFixture(AttributePackerMixin):
+        def __init__(self):
+            self.red = self.green = self.blue = 0.5
+            self.x = self.y = 0.0
+            self.dimmer = 1.0
+            self.mode = 3
+            AttributePackerMixin.__init__(self, (
+                *(AttributePackerMixin.Attribute(name, 'onebyte') for name in ('red', 'green', 'blue', 'dimmer')),
+                *(AttributePackerMixin.Attribute(name, 'plusminusonebyte') for name in ('x', 'y')),
+                AttributePackerMixin.Attribute('mode', 'byte'),
+            ))
+
+    fixtures = tuple(_BenchmarkFixture() for _ in range(items))
+    buffer = bytearray(sum(fixture.pack_size for fixture in fixtures))
+
+    def _timeit(func):
+        return min(timeit.repeat(func, number=repeat, repeat=3)) / repeat * 1000
+
+    def _per_item(func):
+        def _frame():
+            offset = 0
+            for fixture in fixtures:
+                offset = func(fixture, buffer, offset)
+        return _frame
+
+    for name, pack, unpack in (
+            ('per_attribute', _per_item(_pack_per_attribute), _per_item(_unpack_per_attribute)),
+            ('compiled', _per_item(AttributePackerMixin.pack), _per_item(AttributePackerMixin.unpack)),
+    ):
+        print('{0:>14}: pack {1:.3f}ms unpack {2:.3f}ms per frame of {3} items'.format(name, _timeit(pack), _timeit(unpack), items))
+
+    if np:
+        columnar = _TestColumnarPackerCollection(fixtures)
+        print('{0:>14}: pack {1:.3f}ms unpack {2:.3f}ms per frame of {3} items'.format(
+            'columnar', _timeit(lambda: columnar.pack(buffer, 0)), _timeit(lambda: columnar.unpack(buffer, 0)), items,
+        ))
+
+if __name__ == "__main__":
+    _benchmark()
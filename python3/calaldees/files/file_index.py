@@ -0,0 +1,111 @@
+import os
+import sqlite3
+from functools import partial
+
+from .scan import fast_scan, fast_scan_regex_filter, hashfile
+from ..lazy import LazyString
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def _stat_key(stats):
+    return (stats.st_size, stats.st_mtime_ns, stats.st_ino)
+
+
+class FileIndex(object):
+    """
+    Persistent (sqlite) index of (size, mtime_ns, inode, hash) for each file under a scanned root.
+
+    `FileIndex.fast_scan` yields the same `FileScan`s as `scan.fast_scan`, but a file's hash is
+    only recalculated when its size/mtime/inode differ from the index.
+    Files no longer found by a scan are removed from the index.
+    Changes are held in memory until `save()`/`close()`.
+
+        with FileIndex('files.index') as index:
+            hashfiles('data/', index=index)
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS files (
+            root TEXT NOT NULL,
+            relative TEXT NOT NULL,
+            size INTEGER,
+            mtime_ns INTEGER,
+            inode INTEGER,
+            hash TEXT,
+            PRIMARY KEY (root, relative)
+        )
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._connection = sqlite3.connect(filename)
+        self._connection.execute(self.SCHEMA)
+        self._roots = {}
+        self._dirty = set()
+        self._deleted = set()
+
+    def _get_root(self, abs_root):
+        if abs_root not in self._roots:
+            self._roots[abs_root] = {
+                relative: (size, mtime_ns, inode, hash)
+                for relative, size, mtime_ns, inode, hash in self._connection.execute(
+                    'SELECT relative, size, mtime_ns, inode, hash FROM files WHERE root = ?', (abs_root, )
+                )
+            }
+        return self._roots[abs_root]
+
+    def hash(self, abs_root, relative, absolute, stats):
+        """
+        return the indexed hash for `relative` if `stats` are unchanged, else hash the file and record it
+        """
+        files = self._get_root(abs_root)
+        key = _stat_key(stats)
+        cached = files.get(relative)
+        if cached and cached[:3] == key:
+            return cached[3]
+        hash = hashfile(absolute)
+        files[relative] = key + (hash, )
+        self._dirty.add((abs_root, relative))
+        self._deleted.discard((abs_root, relative))
+        return hash
+
+    def fast_scan(self, root, path=None, search_filter=fast_scan_regex_filter()):
+        abs_root = os.path.abspath(root)
+        files = self._get_root(abs_root)
+        seen = set()
+        for f in fast_scan(root, path, search_filter):
+            seen.add(f.relative)
+            yield f._replace(hash=LazyString(partial(self.hash, abs_root, f.relative, f.absolute, f.stats)))
+
+        # Forget files that this scan would have found
+        prefix = f"{path.strip('/')}/" if path else ''
+        for relative in files.keys() - seen:
+            if relative.startswith(prefix) and search_filter(relative):
+                del files[relative]
+                self._dirty.discard((abs_root, relative))
+                self._deleted.add((abs_root, relative))
+
+    def save(self):
+        with self._connection:
+            self._connection.executemany(
+                'DELETE FROM files WHERE root = ? AND relative = ?',
+                self._deleted,
+            )
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO files (root, relative, size, mtime_ns, inode, hash) VALUES (?, ?, ?, ?, ?, ?)',
+                ((abs_root, relative) + self._roots[abs_root][relative] for abs_root, relative in self._dirty),
+            )
+        log.debug(f'Saved {len(self._dirty)} changed and {len(self._deleted)} removed files to {self.filename}')
+        self._dirty.clear()
+        self._deleted.clear()
+
+    def close(self):
+        self.save()
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -49,6 +49,93 @@ def fast_scan(root, path=None, search_filter=fast_scan_regex_filter()):
                 yield sub_dir_entry
 
 
+class ScanRecord(object):
+    """
+    Lightweight `fast_scan_parallel` result with the same attributes as `FileScan`.
+    `stats` reuses the (cached) `os.DirEntry.stat()` and `abspath`/`ext`/`hash` are only computed when accessed.
+    """
+    __slots__ = ('folder', 'file', 'absolute', 'relative', '_abs_root', '_dir_entry', '_hash')
+
+    def __init__(self, folder, relative, dir_entry, abs_root):
+        self.folder = folder
+        self.file = dir_entry.name
+        self.absolute = dir_entry.path
+        self.relative = relative
+        self._abs_root = abs_root
+        self._dir_entry = dir_entry
+        self._hash = None
+
+    @property
+    def abspath(self):
+        return os.path.join(self._abs_root, self.relative)
+
+    @property
+    def stats(self):
+        return self._dir_entry.stat()
+
+    @property
+    def ext(self):
+        return file_ext(self.file)[1]
+
+    @property
+    def file_no_ext(self):
+        return file_ext(self.file)[0]
+
+    @property
+    def hash(self):
+        if self._hash is None:
+            self._hash = LazyString(partial(hashfile, self.absolute))
+        return self._hash
+
+    def __repr__(self):
+        return f'ScanRecord({self.relative!r})'
+
+
+def _scan_folder(root, abs_root, path, search_filter):
+    """
+    return ([ScanRecord], [sub folder paths]) for a single folder
+    """
+    files = []
+    folders = []
+    prefix = f'{path}/' if path else ''
+    with os.scandir(os.path.join(root, path)) as dir_entrys:
+        for dir_entry in dir_entrys:
+            relative = prefix + dir_entry.name
+            if (dir_entry.is_file() or dir_entry.is_symlink()) and search_filter(relative):
+                files.append(ScanRecord(path, relative, dir_entry, abs_root))
+            if dir_entry.is_dir():
+                folders.append(relative)
+    return files, folders
+
+
+DEFAULT_SCAN_WORKERS = 8
+
+def fast_scan_parallel(root, path=None, search_filter=fast_scan_regex_filter(), workers=DEFAULT_SCAN_WORKERS):
+    """
+    Same results as `fast_scan`, but folders are listed concurrently in a thread pool
+    and `ScanRecord`s are yielded as each folder is listed (the order is not deterministic).
+    """
+    abs_root = os.path.abspath(root)
+    root = root.rstrip('/') or root
+    import queue
+    from concurrent.futures import ThreadPoolExecutor
+    completed = queue.Queue()  # Futures are put here as they complete
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fast_scan')
+    def scan_folder(folder):
+        executor.submit(_scan_folder, root, abs_root, folder, search_filter).add_done_callback(completed.put)
+    try:
+        scan_folder(path or '')
+        outstanding = 1
+        while outstanding:
+            files, folders = completed.get().result()
+            outstanding += len(folders) - 1
+            for folder in folders:
+                scan_folder(folder)
+            yield from files
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
 def hashfile(filehandle, hasher=hashlib.sha256, blocksize=65535):
     if not hasher:
         return
@@ -76,20 +163,23 @@ def hash_data(data, hasher=hashlib.sha256):
     return hasher.hexdigest()
 
 
-def hashfiles(*args, **kwargs):
+def hashfiles(*args, index=None, **kwargs):
     """
     use same args as fast_scan
+    `index` (a `file_index.FileIndex`) avoids rehashing unchanged files
     """
+    _fast_scan = index.fast_scan if index else fast_scan
     file_hashs = tuple(sorted(
         (filescan.relative, filescan.hash)
-        for filescan in fast_scan(*args, **kwargs)
+        for filescan in _fast_scan(*args, **kwargs)
     ))
     return hash_data(file_hashs)
 
-def hashfiles_list(path, files):
+def hashfiles_list(path, files, index=None):
     if isinstance(files, str):
         files = (files, )
     return hashfiles(
         path,
-        search_filter=fast_scan_regex_filter(r'|'.join(files))
+        search_filter=fast_scan_regex_filter(r'|'.join(files)),
+        index=index,
     )
@@ -2,19 +2,338 @@ import threading
 import time
 import multiprocessing
 import collections
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
 from itertools import chain
 
-from .scan import fast_scan
+from .scan import fast_scan, fast_scan_regex_filter
+
+import logging
+log = logging.getLogger(__name__)
 
 DEFAULT_RESCAN_INTERVAL = 2.0
+DEFAULT_COALESCE_DELAY = 0.1
+
+
+# Inotify ----------------------------------------------------------------------
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+
+class Inotify(object):
+    """
+    Minimal ctypes wrapper for Linux inotify
+    """
+    EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len(name)
+    READ_SIZE = 64 * 1024
+
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, 'inotify is only available on linux')
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            self._raise('inotify_init1')
+
+    def _raise(self, *args):
+        _errno = ctypes.get_errno()
+        raise OSError(_errno, os.strerror(_errno), *args)
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            self._raise(path)
+        return wd
+
+    def rm_watch(self, wd):
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout=None):
+        """
+        return [(wd, mask, cookie, name)] or an empty list if no events arrive within `timeout` seconds
+        """
+        if not select.select((self.fd, ), (), (), timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, self.READ_SIZE)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            events.append((wd, mask, cookie, os.fsdecode(data[offset:offset + length].rstrip(b'\0'))))
+            offset += length
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class InotifyWatcher(object):
+    """
+    Recursively watch `paths` and return coalesced sets of changed (relative, abspath), like the polling scan.
+    New folders are watched as they appear and the files already in them are reported.
+    Files in removed folders are reported from the set of known files.
+    If the kernel event queue overflows, the whole tree is re-listed and every file is reported as changed.
+    `path`/`search_filter` are the same as `fast_scan`
+    """
+
+    def __init__(self, paths, path=None, search_filter=fast_scan_regex_filter(), inotify=None):
+        self.paths = paths
+        self.path = path or ''
+        self.search_filter = search_filter
+        self.inotify = inotify or Inotify()
+        self.watches = {}  # wd -> (root, relative_folder)
+        self.known = set()  # (root, relative)
+        try:
+            for root in self.paths:
+                self._watch_folder(root, self.path, set())
+        except OSError:
+            self.close()
+            raise
+
+    def _item(self, root, relative):
+        return (relative, os.path.abspath(os.path.join(root, relative)))
+
+    def _watch_folder(self, root, relative_folder, changed):
+        """
+        Watch a folder (before listing it, so no files are missed) and all its sub folders
+        """
+        folder = os.path.join(root, relative_folder)
+        try:
+            wd = self.inotify.add_watch(folder)
+            dir_entrys = tuple(os.scandir(folder))
+        except OSError as ex:
+            if ex.errno == errno.ENOSPC:
+                raise  # Out of watches (fs.inotify.max_user_watches)
+            return  # Folder has already gone
+        self.watches[wd] = (root, relative_folder)
+        for dir_entry in dir_entrys:
+            relative = os.path.join(relative_folder, dir_entry.name)
+            if (dir_entry.is_file() or dir_entry.is_symlink()) and self.search_filter(relative):
+                self.known.add((root, relative))
+                changed.add(self._item(root, relative))
+            if dir_entry.is_dir():
+                self._watch_folder(root, relative, changed)
+
+    def _forget_folder(self, root, relative_folder, changed):
+        prefix = relative_folder + '/'
+        removed = {(_root, relative) for _root, relative in self.known if _root == root and relative.startswith(prefix)}
+        self.known -= removed
+        changed.update(self._item(*f) for f in removed)
+        for wd, (_root, _relative_folder) in tuple(self.watches.items()):
+            if _root == root and (_relative_folder == relative_folder or _relative_folder.startswith(prefix)):
+                self.inotify.rm_watch(wd)
+                del self.watches[wd]
+
+    def _resync(self, changed):
+        changed.update(self._item(*f) for f in self.known)
+        self.known.clear()
+        for root in self.paths:
+            self._watch_folder(root, self.path, changed)
+
+    def _handle_event(self, wd, mask, cookie, name, changed):
+        if mask & IN_Q_OVERFLOW:
+            log.warning('inotify event queue overflowed - rescanning')
+            self._resync(changed)
+            return
+        if mask & IN_IGNORED:
+            self.watches.pop(wd, None)
+            return
+        if wd not in self.watches:
+            return
+        root, relative_folder = self.watches[wd]
+        relative = os.path.join(relative_folder, name)
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._watch_folder(root, relative, changed)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._forget_folder(root, relative, changed)
+            return
+        if not self.search_filter(relative):
+            return
+        if mask & (IN_DELETE | IN_MOVED_FROM):
+            self.known.discard((root, relative))
+        else:
+            self.known.add((root, relative))
+        changed.add(self._item(root, relative))
 
-def file_scan_diff_thread(paths, onchange_function=None, rescan_interval=DEFAULT_RESCAN_INTERVAL, **kwargs):
+    def wait(self, coalesce_delay=DEFAULT_COALESCE_DELAY, max_delay=DEFAULT_RESCAN_INTERVAL):
+        """
+        Block until files change. Events are gathered until none arrive for `coalesce_delay`
+        (or `max_delay` after the first event) and returned as one set of (relative, abspath)
+        """
+        changed = set()
+        while not changed:
+            events = self.inotify.read()
+            expire_time = time.monotonic() + max_delay
+            while events:
+                for event in events:
+                    self._handle_event(*event, changed)
+                events = self.inotify.read(min(coalesce_delay, max(0, expire_time - time.monotonic())))
+        return changed
+
+    def close(self):
+        self.inotify.close()
+
+
+# Directory mtime polling ------------------------------------------------------
+
+FolderState = collections.namedtuple('FolderState', ('mtime_ns', 'listed_ns', 'files', 'folders'))  # files: {relative: mtime_ns}, folders: {relative}
+MTIME_GRANULARITY_NS = 1_000_000_000
+
+
+class DirectoryMtimePoller(object):
+    """
+    Poll for changes by stat'ing every folder and only re-listing folders whose mtime has changed.
+    The previous scan is kept per folder, so polling cost scales with the number of folders and changes, not files.
+
+    A folder's mtime changes when files are created, removed or renamed in it.
+    Content changes to an existing file (without a rename) are NOT detected.
+    Folders modified within `MTIME_GRANULARITY_NS` of being listed are re-listed on the next poll
+    (filesystems like NFS may have coarse timestamps).
+    The watched root folders are always polled, so a root that disappears is re-listed when it comes back.
+    `path`/`search_filter` are the same as `fast_scan`
+
+    >>> import tempfile, shutil
+    >>> root = tempfile.mkdtemp()
+    >>> poller = DirectoryMtimePoller((root, ))
+    >>> def changed():
+    ...     return sorted(relative for relative, abspath in poller.poll())
+    >>> changed()
+    []
+    >>> open(os.path.join(root, 'a.txt'), 'w').close()
+    >>> changed()
+    ['a.txt']
+    >>> os.makedirs(os.path.join(root, 'sub', 'deep'))
+    >>> open(os.path.join(root, 'sub', 'deep', 'b.txt'), 'w').close()
+    >>> changed()
+    ['sub/deep/b.txt']
+    >>> os.remove(os.path.join(root, 'a.txt'))
+    >>> changed()
+    ['a.txt']
+    >>> shutil.rmtree(os.path.join(root, 'sub'))
+    >>> changed()
+    ['sub/deep/b.txt']
+    >>> os.rmdir(root)
+    >>> changed()
+    []
+    >>> os.makedirs(root)
+    >>> open(os.path.join(root, 'c.txt'), 'w').close()
+    >>> changed()
+    ['c.txt']
+    >>> shutil.rmtree(root)
+    """
+
+    def __init__(self, paths, path=None, search_filter=fast_scan_regex_filter()):
+        self.paths = paths
+        self.search_filter = search_filter
+        self.folders = {}  # (root, relative_folder) -> FolderState
+        self.roots = {(root, path or '') for root in self.paths}
+        for root, relative_folder in self.roots:
+            self._list_folder(root, relative_folder, set())
+
+    def _item(self, root, relative):
+        return (relative, os.path.abspath(os.path.join(root, relative)))
+
+    def _list_folder(self, root, relative_folder, changed):
+        folder = os.path.join(root, relative_folder)
+        listed_ns = time.time_ns()
+        try:
+            mtime_ns = os.stat(folder).st_mtime_ns  # stat before listing, so a change during listing is seen next poll
+            dir_entrys = tuple(os.scandir(folder))
+        except OSError:
+            self._forget_folder(root, relative_folder, changed)
+            if (root, relative_folder) in self.roots:
+                self.folders[(root, relative_folder)] = FolderState(None, 0, {}, set())
+            return
+        files = {}
+        folders = set()
+        for dir_entry in dir_entrys:
+            relative = os.path.join(relative_folder, dir_entry.name)
+            if (dir_entry.is_file() or dir_entry.is_symlink()) and self.search_filter(relative):
+                try:
+                    files[relative] = dir_entry.stat().st_mtime_ns
+                except OSError:
+                    pass
+            if dir_entry.is_dir():
+                folders.add(relative)
+
+        previous = self.folders.get((root, relative_folder)) or FolderState(None, None, {}, set())
+        self.folders[(root, relative_folder)] = FolderState(mtime_ns, listed_ns, files, folders)
+        changed.update(
+            self._item(root, relative)
+            for relative in files.keys() | previous.files.keys()
+            if files.get(relative) != previous.files.get(relative)
+        )
+        for relative in folders - previous.folders:
+            self._list_folder(root, relative, changed)
+        for relative in previous.folders - folders:
+            self._forget_folder(root, relative, changed)
+
+    def _forget_folder(self, root, relative_folder, changed):
+        state = self.folders.pop((root, relative_folder), None)
+        if not state:
+            return
+        changed.update(self._item(root, relative) for relative in state.files)
+        for relative in state.folders:
+            self._forget_folder(root, relative, changed)
+
+    def poll(self):
+        """
+        return set of changed (relative, abspath) since the last poll
+        """
+        changed = set()
+        for (root, relative_folder), state in tuple(self.folders.items()):
+            if (root, relative_folder) not in self.folders:
+                continue  # Removed with a parent folder this poll
+            try:
+                mtime_ns = os.stat(os.path.join(root, relative_folder)).st_mtime_ns
+            except OSError:
+                mtime_ns = None
+            if mtime_ns != state.mtime_ns or (mtime_ns is not None and mtime_ns >= state.listed_ns - MTIME_GRANULARITY_NS):
+                self._list_folder(root, relative_folder, changed)
+        return changed
+
+
+# ------------------------------------------------------------------------------
+
+def file_scan_diff_thread(paths, onchange_function=None, rescan_interval=DEFAULT_RESCAN_INTERVAL, backend='poll', coalesce_delay=DEFAULT_COALESCE_DELAY, **kwargs):
     """
     Used in a separate thread to indicate if a file has changed
     Use onchange_function if working in a single thread mode
+
+    backend:
+        'poll' (default) rescans all files every `rescan_interval`
+        'poll_folders' stats all folders every `rescan_interval` and only re-lists changed folders (see `DirectoryMtimePoller`)
+        'inotify' (linux) waits for file events. Bursts of events are coalesced into one change set.
+            Files are reported on create/modify/attribute change/delete/rename events rather than on an mtime difference.
+        'auto' uses inotify when available and falls back to polling
+    kwargs are passed to `fast_scan` (or the equivalent `path`/`search_filter` of the other backends)
     """
     rescan_interval = rescan_interval or DEFAULT_RESCAN_INTERVAL
     assert rescan_interval > 0
+    assert backend in ('auto', 'poll', 'poll_folders', 'inotify')
 
     if isinstance(paths, str):
         paths = paths.split(',')
@@ -34,7 +353,7 @@ def file_scan_diff_thread(paths, onchange_function=None, rescan_interval=DEFAULT
 
     queue = multiprocessing.Queue()
     report_filechange = onchange_function if onchange_function else queue.put
-    def scan_loop():
+    def poll_loop():
         reference_scan = scan_set(paths)
         while True:
             this_scan = scan_set(paths)
@@ -44,6 +363,36 @@ def file_scan_diff_thread(paths, onchange_function=None, rescan_interval=DEFAULT
                 report_filechange({(f.relative, f.abspath) for f in changed_files_diff})
             time.sleep(rescan_interval)
 
+    def poll_folders_loop():
+        poller = DirectoryMtimePoller(paths, **kwargs)
+        while True:
+            time.sleep(rescan_interval)
+            changed_files = poller.poll()
+            if changed_files:
+                report_filechange(changed_files)
+
+    def inotify_loop(watcher):
+        try:
+            while True:
+                report_filechange(watcher.wait(coalesce_delay=coalesce_delay, max_delay=rescan_interval))
+        except OSError as ex:
+            if ex.errno != errno.ENOSPC:
+                raise
+            log.warning('Out of inotify watches - falling back to polling')
+        finally:
+            watcher.close()
+        poll_loop()
+
+    scan_loop = poll_folders_loop if backend == 'poll_folders' else poll_loop
+    if backend in ('auto', 'inotify'):
+        try:
+            watcher = InotifyWatcher(paths, **kwargs)
+            scan_loop = lambda: inotify_loop(watcher)
+        except OSError as ex:
+            if backend == 'inotify':
+                raise
+            log.info(f'inotify unavailable ({ex}) - polling every {rescan_interval}s')
+
     if onchange_function:
         scan_loop()
     else:
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+try:
+    from . import file_index
+    from .file_index import FileIndex
+    from .scan import hashfiles
+except ModuleNotFoundError as ex:  # `scan` imports `file_ext` from `files/exts.py`, which is missing from this tree
+    pytest.skip(f'files.scan can not be imported: {ex}', allow_module_level=True)
+
+
+@pytest.fixture()
+def hashed(monkeypatch):
+    """List of files hashed by the index"""
+    hashed = []
+    hashfile = file_index.hashfile
+    def _hashfile(filename, *args, **kwargs):
+        hashed.append(os.path.basename(filename))
+        return hashfile(filename, *args, **kwargs)
+    monkeypatch.setattr(file_index, 'hashfile', _hashfile)
+    return hashed
+
+
+def test_file_index(tmp_path, hashed):
+    root = tmp_path / 'root'
+    os.makedirs(root / 'sub')
+    (root / 'a.txt').write_text('a')
+    (root / 'sub' / 'b.txt').write_text('b')
+    index_filename = str(tmp_path / 'files.index')
+
+    with FileIndex(index_filename) as index:
+        assert hashfiles(str(root), index=index) == hashfiles(str(root))
+    assert sorted(hashed) == ['a.txt', 'b.txt']
+
+    # Unchanged files are answered from the index (a new process/connection)
+    hashed.clear()
+    with FileIndex(index_filename) as index:
+        assert hashfiles(str(root), index=index) == hashfiles(str(root))
+    assert hashed == []
+
+    # Only changed files are rehashed and vanished files are removed from the index
+    (root / 'a.txt').write_text('changed')
+    os.remove(root / 'sub' / 'b.txt')
+    with FileIndex(index_filename) as index:
+        assert hashfiles(str(root), index=index) == hashfiles(str(root))
+    assert hashed == ['a.txt']
+    with FileIndex(index_filename) as index:
+        assert [relative for relative, in index._connection.execute('SELECT relative FROM files')] == ['a.txt']
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+try:
+    from .scan import fast_scan, fast_scan_parallel
+except ModuleNotFoundError as ex:  # `scan` imports `file_ext` from `files/exts.py`, which is missing from this tree
+    pytest.skip(f'files.scan can not be imported: {ex}', allow_module_level=True)
+
+
+@pytest.fixture()
+def tree(tmp_path):
+    for folder in ('', 'a', 'a/b', 'a/b/c', 'd', '.hidden'):
+        os.makedirs(tmp_path / folder, exist_ok=True)
+        for index in range(3):
+            (tmp_path / folder / f'file{index}.txt').write_text(f'{folder} {index}')
+    return str(tmp_path)
+
+
+def _scan_fields(scan):
+    return sorted(
+        (f.relative, f.folder, f.file, f.absolute, f.abspath, f.stats.st_size, f.ext, f.file_no_ext, str(f.hash))
+        for f in scan
+    )
+
+
+def test_fast_scan_parallel_matches_fast_scan(tree):
+    expected = _scan_fields(fast_scan(tree))
+    assert len(expected) == 15  # '.hidden' is ignored by the default search_filter
+    assert _scan_fields(fast_scan_parallel(tree, workers=4)) == expected
+    assert _scan_fields(fast_scan_parallel(tree + '/', workers=1)) == _scan_fields(fast_scan(tree + '/'))
+    assert _scan_fields(fast_scan_parallel(tree, path='a')) == _scan_fields(fast_scan(tree, path='a'))
+
+
+def test_fast_scan_parallel_records_are_slotted(tree):
+    record = next(iter(fast_scan_parallel(tree)))
+    assert not hasattr(record, '__dict__')
+
+
+def test_fast_scan_parallel_close_early(tree):
+    scan = fast_scan_parallel(tree, workers=2)
+    next(scan)
+    scan.close()
@@ -0,0 +1,85 @@
+import os
+import shutil
+import time
+
+import pytest
+
+try:
+    from .scan_thread import Inotify, InotifyWatcher
+except ModuleNotFoundError as ex:  # `scan` imports `file_ext` from `files/exts.py`, which is missing from this tree
+    pytest.skip(f'files.scan can not be imported: {ex}', allow_module_level=True)
+
+
+@pytest.fixture()
+def watcher_factory():
+    try:
+        Inotify().close()
+    except OSError as ex:
+        pytest.skip(f'inotify unavailable: {ex}')
+    watchers = []
+    def _watcher_factory(*args, **kwargs):
+        watchers.append(InotifyWatcher(*args, **kwargs))
+        return watchers[-1]
+    yield _watcher_factory
+    for watcher in watchers:
+        watcher.close()
+
+
+def _changed(watcher):
+    return sorted(relative for relative, abspath in watcher.wait(coalesce_delay=0.05, max_delay=1))
+
+
+def test_inotify_watcher(tmp_path, watcher_factory):
+    root = str(tmp_path)
+    (tmp_path / 'a.txt').write_text('a')
+    watcher = watcher_factory((root, ))
+    assert watcher.known == {(root, 'a.txt')}
+
+    # Bursts of events on one file are coalesced
+    for _ in range(10):
+        with open(tmp_path / 'a.txt', 'a') as filehandle:
+            filehandle.write('a')
+    assert _changed(watcher) == ['a.txt']
+
+    os.rename(tmp_path / 'a.txt', tmp_path / 'b.txt')
+    assert _changed(watcher) == ['a.txt', 'b.txt']
+
+    # New folders are watched and their files reported
+    os.makedirs(tmp_path / 'sub' / 'deep')
+    (tmp_path / 'sub' / 'deep' / 'c.txt').write_text('c')
+    assert _changed(watcher) == ['sub/deep/c.txt']
+    (tmp_path / 'sub' / 'deep' / 'c.txt').write_text('cc')
+    assert _changed(watcher) == ['sub/deep/c.txt']
+
+    # Renamed folders report the files moved out and in
+    os.rename(tmp_path / 'sub', tmp_path / 'moved')
+    assert _changed(watcher) == ['moved/deep/c.txt', 'sub/deep/c.txt']
+
+    # Removed folders report their known files
+    shutil.rmtree(tmp_path / 'moved')
+    assert _changed(watcher) == ['moved/deep/c.txt']
+    assert watcher.known == {(root, 'b.txt')}
+
+    # Ignored files are not reported
+    (tmp_path / '.hidden').write_text('x')
+    (tmp_path / 'd.txt').write_text('d')
+    assert _changed(watcher) == ['d.txt']
+
+
+def test_inotify_watcher_path(tmp_path, watcher_factory):
+    os.makedirs(tmp_path / 'sub')
+    watcher = watcher_factory((str(tmp_path), ), path='sub')
+    (tmp_path / 'a.txt').write_text('a')
+    (tmp_path / 'sub' / 'b.txt').write_text('b')
+    assert _changed(watcher) == ['sub/b.txt']
+
+
+def test_file_scan_diff_thread_fast_scan_kwargs(tmp_path):
+    from .scan_thread import file_scan_diff_thread
+    os.makedirs(tmp_path / 'sub')
+    for backend in ('poll', 'poll_folders'):
+        queue = file_scan_diff_thread(str(tmp_path), rescan_interval=0.05, backend=backend, path='sub')
+        time.sleep(0.2)  # The initial reference scan happens in the thread
+        (tmp_path / f'{backend}.txt').write_text('ignored')
+        (tmp_path / 'sub' / f'{backend}.txt').write_text('b')
+        assert queue.get(timeout=5) == {(f'sub/{backend}.txt', str(tmp_path / 'sub' / f'{backend}.txt'))}
@@ -1,6 +1,11 @@
 import time
+import asyncio
+import inspect
+from collections import deque
 
 DEFAULT_SLEEP_FACTOR = 0.8
+DEFAULT_SPIN_THRESHOLD = 0.002
+DEFAULT_TELEMETRY_SIZE = 1024
 
 
 class Loop(object):
@@ -73,5 +78,174 @@ class Loop(object):
             self.running = False
 
 
+class FrameTelemetry(object):
+    """
+    Fixed size ring buffer of per frame lateness and render duration (nanoseconds)
+
+    >>> telemetry = FrameTelemetry(size=4)
+    >>> for lateness in (1, 2, 3, 4, 5):
+    ...     telemetry.record(lateness * 1000000, 500000, dropped=lateness > 4)
+    >>> stats = telemetry.stats()
+    >>> stats['frames'], stats['dropped_frames']
+    (5, 1)
+    >>> stats['lateness_ms']
+    {'p50': 4.0, 'p99': 5.0, 'max': 5.0}
+    >>> stats['duration_ms']['max']
+    0.5
+    """
+    def __init__(self, size=DEFAULT_TELEMETRY_SIZE):
+        self.lateness = deque(maxlen=size)
+        self.duration = deque(maxlen=size)
+        self.frames = 0
+        self.dropped_frames = 0
+
+    def record(self, lateness_ns, duration_ns, dropped=False):
+        self.lateness.append(lateness_ns)
+        self.duration.append(duration_ns)
+        self.frames += 1
+        self.dropped_frames += bool(dropped)
+
+    @staticmethod
+    def _percentiles_ms(values):
+        values = sorted(values)
+        if not values:
+            return {'p50': None, 'p99': None, 'max': None}
+        def _percentile(percent):
+            return values[min(len(values) - 1, int(len(values) * percent))] / 1000000
+        return {'p50': _percentile(0.5), 'p99': _percentile(0.99), 'max': values[-1] / 1000000}
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'dropped_frames': self.dropped_frames,
+            'lateness_ms': self._percentiles_ms(self.lateness),
+            'duration_ms': self._percentiles_ms(self.duration),
+        }
+
+
+class PrecisionLoop(Loop):
+    """
+    Drift free Loop scheduled with `time.perf_counter_ns`.
+    Frame deadlines are calculated from the start time (not the previous frame) so errors do not accumulate.
+    The loop sleeps until `spin_threshold` seconds before the next deadline and then spin-waits for sub-millisecond jitter.
+    Every rendered frame records its lateness and render duration in `self.telemetry` (live `telemetry.stats()`).
+    A frame is counted as dropped if it was rendered more than one period after its deadline.
+
+    `self.start_time` and `self.current_time` are `perf_counter` seconds (not `time.time`)
+
+    >>> class _TestLoop(PrecisionLoop):
+    ...     def render(self, frame):
+    ...         if frame >= 5:
+    ...             raise self.LoopInterruptException()
+    >>> loop = _TestLoop(1000)
+    >>> loop.run()
+    >>> loop.telemetry.frames
+    5
+    """
+    def __init__(self, fps, timeshift=0, spin_threshold=DEFAULT_SPIN_THRESHOLD, telemetry_size=DEFAULT_TELEMETRY_SIZE):
+        self.spin_threshold_ns = int(spin_threshold * 1000000000)
+        self.telemetry = FrameTelemetry(telemetry_size)
+        super().__init__(fps, timeshift, sleep_factor=1.0)
+
+    def set_period(self, fps, timeshift=0):
+        assert fps > 0, 'fps rate must be provided'
+        assert timeshift >= 0, 'timeshift must be positive'
+        self.fps = fps
+        self.period = 1 / fps
+        self.period_ns = round(1000000000 / fps)
+        now_ns = time.perf_counter_ns()
+        self.start_time_ns = now_ns - int(timeshift * 1000000000)
+        self.previous_time_ns = now_ns - self.period_ns  # Previous time is one frame ago to trigger immediately
+        self.start_time = self.start_time_ns / 1000000000
+        self.previous_time = self.previous_time_ns / 1000000000
+        return self.period
+
+    def render(self, frame):
+        """
+        Override. Frame accuracy is recorded in `self.telemetry`, so (unlike `Loop.render`) nothing is profiled here
+        """
+        pass
+
+    def get_frame_ns(self, timestamp_ns):
+        return (timestamp_ns - self.start_time_ns) // self.period_ns
+
+    def get_frame_deadline_ns(self, frame):
+        return self.start_time_ns + (self.period_ns * frame)
+
+    def _wait_until_ns(self, deadline_ns):
+        sleep_ns = deadline_ns - time.perf_counter_ns() - self.spin_threshold_ns
+        if sleep_ns > 0:
+            time.sleep(sleep_ns / 1000000000)
+        while time.perf_counter_ns() < deadline_ns:
+            pass
+
+    def run(self):
+        self.running = True
+        try:
+            while self.is_running() and self.period:
+                current_time_ns = time.perf_counter_ns()
+                self.current_time = current_time_ns / 1000000000
+
+                current_frame = self.get_frame_ns(current_time_ns)
+                previous_frame = self.get_frame_ns(self.previous_time_ns)
+                for frame in range(previous_frame + 1, current_frame + 1):
+                    render_start_ns = time.perf_counter_ns()
+                    self.render(frame)
+                    lateness_ns = render_start_ns - self.get_frame_deadline_ns(frame)
+                    self.telemetry.record(lateness_ns, time.perf_counter_ns() - render_start_ns, dropped=lateness_ns > self.period_ns)
+
+                self.previous_time_ns = current_time_ns
+                self.previous_time = self.current_time
+
+                self._wait_until_ns(self.get_frame_deadline_ns(current_frame + 1))
+        except KeyboardInterrupt:
+            pass
+        except self.LoopInterruptException:
+            pass
+        self.close()
+
+
+class AsyncLoop(Loop):
+    """
+    asyncio variant of Loop. `render(frame)`/`get_frame` behave as `Loop.run()`, including catching up missed frames,
+    but waiting for the next frame deadline is an `asyncio.sleep`, so network I/O can share the same thread.
+    `render` can be a normal method or a coroutine.
+    The loop always yields to the event loop between frames, even when running behind.
+
+    >>> class _TestLoop(AsyncLoop):
+    ...     def render(self, frame):
+    ...         if frame >= 3:
+    ...             raise self.LoopInterruptException()
+    ...         self.rendered_frames.append(frame)
+    >>> loop = _TestLoop(1000)
+    >>> loop.rendered_frames = []
+    >>> asyncio.run(loop.run())
+    >>> loop.rendered_frames
+    [0, 1, 2]
+    """
+    def __init__(self, fps, timeshift=0):
+        super().__init__(fps, timeshift, sleep_factor=1.0)
+
+    async def run(self):
+        self.running = True
+        try:
+            while self.is_running() and self.period:
+                self.current_time = time.time()
+
+                current_frame = self.get_frame(self.current_time)
+                previous_frame = self.get_frame(self.previous_time)
+                for frame in range(previous_frame, current_frame):
+                    rendered = self.render(frame + 1)
+                    if inspect.isawaitable(rendered):
+                        await rendered
+
+                self.previous_time = self.current_time
+
+                await asyncio.sleep(max(0, self.start_time + (self.period * (current_frame + 1)) - time.time()))
+        except self.LoopInterruptException:
+            pass
+        self.close()
+
+
 if __name__ == "__main__":
     Loop(60).loop()
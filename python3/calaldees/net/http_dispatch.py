@@ -1,12 +1,170 @@
 import socket
-import re
+import os
+import io
 from itertools import chain
 import urllib.parse
+import selectors
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import logging
 log = logging.getLogger(__name__)
 
 DEFAULT_PORT = 23487
+DEFAULT_BACKLOG = 128
+DEFAULT_WORKERS = 8
+DEFAULT_KEEP_ALIVE_TIMEOUT = 5
+DEFAULT_CONNECTION_TIMEOUT = 10
+RECV_SIZE = 65536
+
+
+def _split_head(buffer):
+    """
+    >>> _split_head(b'GET / HTTP/1.1\\r\\nHost: a\\r\\n\\r\\nbody')
+    (b'GET / HTTP/1.1\\r\\nHost: a', b'body')
+    >>> _split_head(b'GET / HTTP/1.1\\nHost: a\\n\\n')
+    (b'GET / HTTP/1.1\\nHost: a', b'')
+    >>> _split_head(b'GET / HTTP/1.1\\r\\nHost')
+    """
+    index_crlf = buffer.find(b'\r\n\r\n')
+    index_lf = buffer.find(b'\n\n')
+    if index_lf >= 0 and (index_crlf < 0 or index_lf < index_crlf):
+        return bytes(buffer[:index_lf]), bytes(buffer[index_lf + 2:])
+    if index_crlf >= 0:
+        return bytes(buffer[:index_crlf]), bytes(buffer[index_crlf + 4:])
+    return None
+
+
+def _parse_request_head(head):
+    r"""
+    Parse the bytes of a request head (request line + headers)
+
+    >>> request_dict = _parse_request_head(b'GET /test/path?a=1&b=2 HTTP/1.1\r\nHost: localhost\r\nX-Thing: a: b\r\n')
+    >>> request_dict['method'], request_dict['path'], request_dict['query'], request_dict['_version']
+    ('GET', '/test/path', {'a': ['1'], 'b': ['2']}, '1.1')
+    >>> request_dict['Host'], request_dict['X-Thing']
+    ('localhost', 'a: b')
+
+    Header names are case-insensitive, so `_headers` maps lower-cased names to values
+    >>> _parse_request_head(b'POST / HTTP/1.1\r\ncontent-length: 5\r\n')['_headers']
+    {'content-length': '5'}
+    """
+    request_line, *header_lines = head.split(b'\n')
+    method, _, target = request_line.strip().decode('utf8').partition(' ')
+    target, _, version = target.rpartition(' HTTP/')
+    path, _, query = target.partition('?')
+    request_dict = {}
+    headers = {}
+    for header_line in header_lines:
+        key, separator, value = header_line.partition(b':')
+        if separator:
+            key, value = key.strip().decode('utf8'), value.strip().decode('utf8')
+            request_dict[key] = value
+            headers[key.lower()] = value
+    request_dict.update(
+        _headers=headers,
+        method=method,
+        path=path,
+        query=urllib.parse.parse_qs(query),
+        _version=version or '1.0',
+    )
+    return request_dict
+
+
+def _get_body_length(body):
+    """
+    >>> _get_body_length(b'abc')
+    3
+    >>> _get_body_length(iter((b'a', b'b')))
+    """
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        return len(body)
+    if hasattr(body, 'fileno'):
+        try:
+            return os.fstat(body.fileno()).st_size - body.tell()
+        except (OSError, io.UnsupportedOperation):
+            pass
+    return None
+
+
+def _dispatch(func_dispatch, request_dict, **response_defaults):
+    """
+    `_body` of the response can be bytes, a file object (sent with `sendfile` where possible) or an iterator of bytes.
+    Bodys without a known length are sent with chunked transfer encoding
+    """
+    # Create stub HTTP response headers
+    response_dict = {
+        'Server': 'http_dispatch 0.0.0',
+        'Content-Length': None,
+        'Content-Type': 'text/plain',
+        'Connection': 'Closed',
+        '_status': '200 OK',
+        '_body': b'',
+        **response_defaults,
+    }
+
+    # Perform dispatch
+    try:
+        response_dict = func_dispatch(request_dict, response_dict)
+    except Exception as ex:
+        response_dict['_status'] = '500 Internal Server Error'
+        import traceback
+        response_dict['_body'] = traceback.format_exc().encode('utf8')
+
+    if not response_dict['Content-Length']:
+        response_dict['Content-Length'] = _get_body_length(response_dict['_body'])
+    return response_dict
+
+
+def _iter_chunks(body):
+    if hasattr(body, 'read'):
+        return iter(lambda: body.read(RECV_SIZE), b'')
+    return body
+
+
+def _send_response(connection, request_dict, response_dict):
+    body = response_dict['_body']
+    chunked = False
+    if response_dict['Content-Length'] is None:
+        if request_dict.get('_version') == '1.0':
+            response_dict['Connection'] = 'close'  # The end of the body is the end of the connection
+        else:
+            response_dict['Transfer-Encoding'] = 'chunked'
+            chunked = True
+
+    # Construct Response
+    head = '\r\n'.join(chain(
+        ('HTTP/1.1 {_status}'.format(**response_dict), ),
+        (f'{k}: {v}' for k, v in response_dict.items() if not k.startswith('_') and v is not None),
+        ('\r\n', ),
+    )).encode('utf8')
+
+    try:
+        if request_dict['method'] == 'HEAD':
+            connection.sendall(head)
+        elif isinstance(body, (bytes, bytearray, memoryview)):
+            if len(body) <= RECV_SIZE:
+                connection.sendall(head + body)  # Small responses in a single send
+            else:
+                connection.sendall(head)
+                connection.sendall(body)
+        elif chunked:
+            connection.sendall(head)
+            for chunk in _iter_chunks(body):
+                if chunk:
+                    connection.sendall(b'%X\r\n%b\r\n' % (len(chunk), chunk))
+            connection.sendall(b'0\r\n\r\n')
+        elif hasattr(body, 'fileno'):
+            connection.sendall(head)
+            connection.sendfile(body, count=response_dict['Content-Length'])
+        else:
+            connection.sendall(head)
+            for chunk in _iter_chunks(body):
+                connection.sendall(chunk)
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
 
 
 def http_dispatch(func_dispatch, port=None):
@@ -26,44 +184,10 @@ def http_dispatch(func_dispatch, port=None):
     port = port or DEFAULT_PORT
 
     def _handle_request(connection, data):
-        request = data.decode('utf8')  # TODO: Separate out head and body and decode separately (to allow binary bodys if required)
-        request_dict = dict(
-            ((match.group(1).strip(), match.group(2).strip()) for match in re.finditer(r'(.*?)\: (.*)', request)),
-            **re.match(r'(?P<method>.*?) (?P<path>.*?)(?P<query>\?.*)? HTTP/1', request).groupdict(),
-        )
-        #request_dict['query'] = {i.split('=') for i in request_dic.get('query', '').lstrip('?').split('&')}
-        request_dict['query'] = urllib.parse.parse_qs((request_dict.get('query') or '').strip('?'))
-
-        # Create stub HTTP response headers
-        response_dict = {
-            'Server': 'http_dispatch 0.0.0',
-            'Content-Length': None,
-            'Content-Type': 'text/plain',
-            'Connection': 'Closed',
-            '_status': '200 OK',
-            '_body': b'',
-        }
-
-        # Perform dispatch
-        try:
-            response_dict = func_dispatch(request_dict, response_dict)
-        except Exception as ex:
-            response_dict['_status'] = '500 Internal Server Error'
-            import traceback
-            response_dict['_body'] = traceback.format_exc().encode('utf8')
-
-        if not response_dict['Content-Length']:
-            response_dict['Content-Length'] = len(response_dict['_body'])
-
-        # Construct Response
-        connection.sendall('\n'.join(chain(
-            ('HTTP/1.1 {_status}'.format(**response_dict), ),
-            tuple(f'{k}: {v}' for k, v in response_dict.items() if not k.startswith('_')),
-            ('\n', ),
-        )).encode('utf8'))
-        # Send body (if required)
-        if request_dict['method'] != 'HEAD':
-            connection.sendall(response_dict['_body'])
+        head, body = _split_head(data) or (data, b'')
+        request_dict = _parse_request_head(head)
+        request_dict['_body'] = body
+        _send_response(connection, request_dict, _dispatch(func_dispatch, request_dict))
 
     def _serve():
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as soc:
@@ -77,9 +201,8 @@ def http_dispatch(func_dispatch, port=None):
                         log.debug(f'Accepting next connection on {port}')
                         connection, ip_address = soc.accept()
                         log.debug(f'Client Connected: {ip_address}')
-                        # TODO: Thread the handling of each request?
                         with connection:
-                            data = connection.recv(1024)  # TODO: Loop over recv? We may have larger requests
+                            data = connection.recv(1024)  # See `http_dispatch_threaded` for larger requests
                             if data:
                                 _handle_request(connection, data)
                     except BrokenPipeError:
@@ -90,6 +213,156 @@ def http_dispatch(func_dispatch, port=None):
     _serve()
 
 
+# Threaded ---------------------------------------------------------------------
+
+def _read_request(connection, buffer):
+    """
+    Read (the rest of) one request (head + `Content-Length` body) from a non-blocking connection
+    Return (request_dict, remaining_buffer). request_dict is None if the whole request has not been recieved yet
+    Raises ConnectionResetError if the connection was closed
+    """
+    buffer = bytearray(buffer)
+    request_dict = None
+    head_size = request_size = None
+    while True:
+        if request_size is None and (head_body := _split_head(buffer)):
+            head, body = head_body
+            request_dict = _parse_request_head(head)
+            head_size = len(buffer) - len(body)
+            request_size = head_size + int(request_dict['_headers'].get('content-length') or 0)
+        if request_size is not None and len(buffer) >= request_size:
+            request_dict['_body'] = bytes(buffer[head_size:request_size])
+            return request_dict, bytes(buffer[request_size:])
+        try:
+            data = connection.recv(max(RECV_SIZE, (request_size or 0) - len(buffer)))
+        except BlockingIOError:
+            return None, bytes(buffer)
+        if not data:
+            raise ConnectionResetError('Connection closed')
+        buffer += data
+
+
+def _is_keep_alive(request_dict):
+    r"""
+    >>> _is_keep_alive(_parse_request_head(b'GET / HTTP/1.1\r\nconnection: Close\r\n'))
+    False
+    >>> _is_keep_alive(_parse_request_head(b'GET / HTTP/1.0\r\nCONNECTION: keep-alive\r\n'))
+    True
+    """
+    connection = request_dict['_headers'].get('connection', '').lower()
+    if request_dict['_version'] == '1.0':
+        return connection == 'keep-alive'
+    return connection != 'close'
+
+
+def http_dispatch_threaded(func_dispatch, port=None, workers=DEFAULT_WORKERS, backlog=DEFAULT_BACKLOG, keep_alive_timeout=DEFAULT_KEEP_ALIVE_TIMEOUT, stop_event=None):
+    """
+    A multithreaded HTTP/1.1 keep-alive version of `http_dispatch` with the same `func_dispatch` contract
+
+    A selector loop accepts connections and waits for them to become readable.
+    Readable connections are handed to a thread pool that reads the available request data without blocking.
+    Once a whole request (head + `Content-Length` body) has arrived, the worker performs `func_dispatch` and sends the response.
+    Incomplete requests and keep-alive connections are handed back to the selector loop,
+    so a slow client does not occupy a worker thread or block accept.
+
+    request_dict['_body'] contains the request body bytes
+    stop_event: optional `threading.Event` to stop serving
+    """
+    port = port or DEFAULT_PORT
+    stop_event = stop_event or threading.Event()
+    selector = selectors.DefaultSelector()
+    returned_connections = []  # Connections handed back by workers (registered on the selector thread)
+    returned_lock = threading.Lock()
+    wakeup_read, wakeup_write = socket.socketpair()
+    wakeup_read.setblocking(False)
+
+    def _return_connection(connection, buffer):
+        with returned_lock:
+            returned_connections.append((connection, buffer))
+        try:
+            wakeup_write.send(b'\0')
+        except OSError:
+            pass
+
+    def _handle_connection(connection, buffer):
+        try:
+            while True:
+                connection.setblocking(False)
+                request_dict, buffer = _read_request(connection, buffer)
+                if request_dict is None:  # Incomplete request. Wait for more data on the selector thread
+                    break
+                keep_alive = _is_keep_alive(request_dict)
+                response_dict = _dispatch(func_dispatch, request_dict, Connection='keep-alive' if keep_alive else 'close')
+                connection.settimeout(DEFAULT_CONNECTION_TIMEOUT)
+                _send_response(connection, request_dict, response_dict)
+                if not keep_alive or str(response_dict.get('Connection')).lower() != 'keep-alive':
+                    connection.close()
+                    return
+                if not buffer:
+                    break
+        except (OSError, ValueError) as ex:  # Socket errors and malformed requests
+            log.debug(f'Connection error {ex}')
+            connection.close()
+            return
+        except Exception:
+            log.exception('Unhandled error while handling connection')
+            connection.close()
+            return
+        _return_connection(connection, buffer)
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as soc, ThreadPoolExecutor(max_workers=workers) as executor:
+        soc.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        soc.bind(('', port))
+        soc.listen(backlog)
+        soc.setblocking(False)
+        selector.register(soc, selectors.EVENT_READ, None)
+        selector.register(wakeup_read, selectors.EVENT_READ, None)
+        idle = {}  # connection -> (buffer, last_active)
+        log.info(f'Serving on {port} with {workers} workers')
+        try:
+            while not stop_event.is_set():
+                for key, _ in selector.select(timeout=0.5):
+                    if key.fileobj is soc:
+                        try:
+                            connection, ip_address = soc.accept()
+                        except BlockingIOError:
+                            continue
+                        log.debug(f'Client Connected: {ip_address}')
+                        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                        idle[connection] = (b'', time.monotonic())
+                        selector.register(connection, selectors.EVENT_READ, None)
+                    elif key.fileobj is wakeup_read:
+                        try:
+                            while wakeup_read.recv(4096):
+                                pass
+                        except BlockingIOError:
+                            pass
+                        with returned_lock:
+                            returned, returned_connections[:] = tuple(returned_connections), []
+                        for connection, buffer in returned:
+                            idle[connection] = (buffer, time.monotonic())
+                            selector.register(connection, selectors.EVENT_READ, None)
+                    else:
+                        connection = key.fileobj
+                        selector.unregister(connection)
+                        buffer, _ = idle.pop(connection)
+                        executor.submit(_handle_connection, connection, buffer)
+                # Expire idle keep-alive connections
+                expire_time = time.monotonic() - keep_alive_timeout
+                for connection in tuple(connection for connection, (_, last_active) in idle.items() if last_active < expire_time):
+                    selector.unregister(connection)
+                    del idle[connection]
+                    connection.close()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for connection in idle:
+                connection.close()
+            selector.close()
+            wakeup_read.close()
+            wakeup_write.close()
+
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
 
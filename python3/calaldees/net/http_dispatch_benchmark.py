@@ -0,0 +1,170 @@
+"""
+Local (loopback only) load generator for `http_dispatch` server modes
+
+    python3 -m calaldees.net.http_dispatch_benchmark --connections 8 --requests 200
+
+Each server mode is started in a background thread with a trivial dispatcher.
+Concurrent client connections then request small and large response bodies, POST large
+request bodies (checked by the dispatcher, so truncated requests count as errors) and
+report requests/sec and latency percentiles.
+"""
+import socket
+import threading
+import time
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
+
+from .http_dispatch import http_dispatch, http_dispatch_threaded
+
+import logging
+log = logging.getLogger(__name__)
+
+HOST = '127.0.0.1'
+DEFAULT_CONNECTIONS = 8
+DEFAULT_REQUESTS = 200
+DEFAULT_LARGE_SIZE = 1024 * 1024
+DEFAULT_LARGE_REQUEST_SIZE = 1024 * 1024
+
+BenchmarkResult = namedtuple('BenchmarkResult', ('mode', 'request_body', 'body', 'requests', 'errors', 'requests_per_second', 'p50_ms', 'p99_ms', 'max_ms'))
+
+
+def _benchmark_func_dispatch(request_dict, response_dict):
+    size = int(request_dict['query'].get('size', ('0', ))[0])
+    request_size = int(request_dict['query'].get('request_size', ('0', ))[0])
+    if len(request_dict.get('_body', b'')) != request_size:
+        response_dict['_status'] = '400 Bad Request'
+    response_dict['_body'] = b'x' * size if size else b'ok'
+    return response_dict
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as soc:
+        soc.bind((HOST, 0))
+        return soc.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=5):
+    expire_time = time.monotonic() + timeout
+    while time.monotonic() < expire_time:
+        try:
+            socket.create_connection((HOST, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise Exception(f'server on {port} did not start')
+
+
+def _start_single(port):
+    """The original http_dispatch can not be stopped. It is left running in a daemon thread"""
+    threading.Thread(target=http_dispatch, args=(_benchmark_func_dispatch, port), daemon=True).start()
+    return lambda: None
+
+
+def _start_threaded(port):
+    stop_event = threading.Event()
+    thread = threading.Thread(target=http_dispatch_threaded, args=(_benchmark_func_dispatch, port), kwargs={'stop_event': stop_event}, daemon=True)
+    thread.start()
+    def _stop():
+        stop_event.set()
+        thread.join()
+    return _stop
+
+
+SERVER_MODES = {
+    'single': _start_single,
+    'threaded': _start_threaded,
+}
+
+
+def _client(port, path, requests, request_body=b''):
+    """Perform `requests` sequential requests (POST if there is a `request_body`) on one (keep-alive if supported) client connection"""
+    method = 'POST' if request_body else 'GET'
+    latencies = []
+    errors = 0
+    connection = http.client.HTTPConnection(HOST, port, timeout=30)
+    for _ in range(requests):
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, body=request_body or None)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            continue
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+    return latencies, errors
+
+
+def _percentile_ms(sorted_values, percent):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percent))] * 1000
+
+
+def benchmark(mode, size, request_size=0, connections=DEFAULT_CONNECTIONS, requests=DEFAULT_REQUESTS):
+    port = _free_port()
+    stop = SERVER_MODES[mode](port)
+    try:
+        _wait_for_port(port)
+        path = f'/benchmark?size={size}&request_size={request_size}'
+        request_body = b'x' * request_size
+        requests_per_connection = max(1, requests // connections)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            results = tuple(executor.map(lambda _: _client(port, path, requests_per_connection, request_body), range(connections)))
+        duration = time.perf_counter() - start
+    finally:
+        stop()
+    latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+    return BenchmarkResult(
+        mode=mode,
+        request_body=request_size,
+        body=size,
+        requests=len(latencies),
+        errors=sum(errors for _, errors in results),
+        requests_per_second=len(latencies) / duration,
+        p50_ms=_percentile_ms(latencies, 0.5),
+        p99_ms=_percentile_ms(latencies, 0.99),
+        max_ms=_percentile_ms(latencies, 1),
+    )
+
+
+def get_args():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="""
+        Benchmark http_dispatch server modes on localhost
+        """,
+    )
+    parser.add_argument('--modes', nargs='+', choices=tuple(SERVER_MODES.keys()), default=tuple(SERVER_MODES.keys()), help='server modes to compare')
+    parser.add_argument('--connections', type=int, default=DEFAULT_CONNECTIONS, help='concurrent client connections')
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help='total requests per benchmark')
+    parser.add_argument('--large_size', type=int, default=DEFAULT_LARGE_SIZE, help='bytes in large response body')
+    parser.add_argument('--large_request_size', type=int, default=DEFAULT_LARGE_REQUEST_SIZE, help='bytes in large POST request body')
+    return vars(parser.parse_args())
+
+
+def _format_ms(ms):
+    """
+    >>> _format_ms(1.234), _format_ms(None)
+    ('     1.23', '        -')
+    """
+    return f'{ms:>9.2f}' if ms is not None else f'{"-":>9}'
+
+
+def main():
+    args = get_args()
+    print('{0:>10} {1:>12} {2:>10} {3:>8} {4:>6} {5:>10} {6:>9} {7:>9} {8:>9}'.format('mode', 'request_body', 'body', 'requests', 'errors', 'req/s', 'p50_ms', 'p99_ms', 'max_ms'))
+    for mode in args['modes']:
+        for request_size, size in ((0, 0), (0, args['large_size']), (args['large_request_size'], 0)):
+            result = benchmark(mode, size, request_size, connections=args['connections'], requests=args['requests'])
+            print('{0.mode:>10} {0.request_body:>12} {0.body:>10} {0.requests:>8} {0.errors:>6} {0.requests_per_second:>10.1f} {1} {2} {3}'.format(result, *map(_format_ms, (result.p50_ms, result.p99_ms, result.max_ms))))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,50 @@
 import socket
 import threading
+import asyncio
+import struct
+import sys
+
+import logging
+log = logging.getLogger(__name__)
+
+# Linux ancillary data with the number of datagrams the kernel dropped for this socket
+SO_RXQ_OVFL = getattr(socket, 'SO_RXQ_OVFL', 40 if sys.platform.startswith('linux') else None)
 
 
 class UDPMixin(object):
+    """
+    batch_size: Batched receive mode. Datagrams are received into a preallocated ring of buffers (`recvmsg_into`/`recvfrom_into`)
+                and handed to `_recieve_batch(batch)` as a list of (addr, memoryview) without allocating per datagram.
+                After the first (blocking) datagram, already queued datagrams are drained (non-blocking) up to batch_size.
+                The memoryviews are reused; they are only valid until the next batch has been recieved.
+    receive_buffer_size: Set the kernel `SO_RCVBUF` size (bytes)
+
+    In batched mode `self.dropped` is the number of datagrams the kernel dropped (Linux)
+    and `self.truncated` is the number of datagrams larger than `buffer_size`
+    """
     DEFAULT_BUFFER_SIZE = 1024
     DEFAULT_PORT = 5005
     DEFAULT_HOST = '127.0.0.1'
 
-    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, buffer_size=DEFAULT_BUFFER_SIZE):
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, buffer_size=DEFAULT_BUFFER_SIZE, batch_size=0, receive_buffer_size=None):
         assert host
         assert port
         assert buffer_size
+        assert batch_size >= 0
         self.host = host
         self.port = port
         self.buffer_size = buffer_size
+        self.batch_size = batch_size
 
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if receive_buffer_size:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer_size)
+
+        self.dropped = 0
+        self.truncated = 0
+        self._ring = ()
+        if batch_size:
+            self._ring = tuple(memoryview(bytearray(buffer_size)) for _ in range(batch_size * 2))
 
         self.thread = threading.Thread(target=self.recieve_loop, args=())
         self.thread.daemon = True
@@ -28,14 +57,57 @@ class UDPMixin(object):
 
     def recieve_loop(self):
         self.sock.bind((self.host, self.port))
+        if self.batch_size:
+            self._recieve_batch_loop()
         while self.running:
             data, addr = self.sock.recvfrom(self.buffer_size)
             self._recieve(addr, data)
         self.sock.shutdown(socket.SHUT_RDWR)
 
+    def _recieve_batch_loop(self):
+        use_recvmsg = hasattr(self.sock, 'recvmsg_into')
+        ancbufsize = 0
+        if use_recvmsg and SO_RXQ_OVFL:
+            try:
+                self.sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+                ancbufsize = socket.CMSG_SPACE(4)
+            except OSError:
+                pass
+        flags_dontwait = getattr(socket, 'MSG_DONTWAIT', None)
+        ring_offset = 0
+        while self.running:
+            batch = []
+            flags = 0
+            for buffer in self._ring[ring_offset:ring_offset + self.batch_size]:
+                try:
+                    if use_recvmsg:
+                        nbytes, ancdata, msg_flags, addr = self.sock.recvmsg_into((buffer, ), ancbufsize, flags)
+                        if msg_flags & socket.MSG_TRUNC:
+                            self.truncated += 1
+                        for level, type_, data in ancdata:
+                            if level == socket.SOL_SOCKET and type_ == SO_RXQ_OVFL:
+                                self.dropped, = struct.unpack('=I', data[:4])  # Cumulative kernel counter
+                    else:
+                        nbytes, addr = self.sock.recvfrom_into(buffer, 0, flags)
+                except BlockingIOError:
+                    break
+                batch.append((addr, buffer[:nbytes]))
+                if flags_dontwait is None:
+                    break
+                flags = flags_dontwait
+            self._recieve_batch(batch)
+            ring_offset = self.batch_size - ring_offset
+
     def _recieve(self, addr, raw_data):
         print("received {0}: {1}".format(addr, raw_data))
 
+    def _recieve_batch(self, batch):
+        """
+        Override to process a whole batch of (addr, memoryview) datagrams
+        """
+        for addr, raw_data in batch:
+            self._recieve(addr, raw_data)
+
     def _send(self, raw_data):
         try:
             self.sock.sendto(raw_data, (self.host, self.port))
@@ -44,23 +116,145 @@ class UDPMixin(object):
                 pass
 
 
+class AsyncUDPMixin(asyncio.DatagramProtocol):
+    """
+    asyncio DatagramProtocol version of UDPMixin (many sockets can share one event loop)
+    The `_recieve(addr, raw_data)`/`_send(raw_data)` hooks are the same as UDPMixin.
+
+    `_send` calls made in the same event loop iteration are queued and sent together in one flush.
+    `close()` flushes queued datagrams, closes the transport and waits for it to be closed.
+
+    >>> class _Recieve(AsyncUDPMixin):
+    ...     def _recieve(self, addr, raw_data):
+    ...         self.recieved.append(raw_data)
+    >>> async def _test():
+    ...     reciever = _Recieve(port=5124)
+    ...     reciever.recieved = []
+    ...     await reciever.listen()
+    ...     sender = AsyncUDPMixin(port=5124)
+    ...     await sender.open()
+    ...     sender._send(b'1')
+    ...     sender._send(b'2')
+    ...     await sender.close()
+    ...     await asyncio.sleep(0.05)
+    ...     await reciever.close()
+    ...     return reciever.recieved
+    >>> asyncio.run(_test())
+    [b'1', b'2']
+    """
+    DEFAULT_PORT = UDPMixin.DEFAULT_PORT
+    DEFAULT_HOST = UDPMixin.DEFAULT_HOST
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        assert host
+        assert port
+        self.host = host
+        self.port = port
+        self.transport = None
+        self._send_queue = []
+        self._closed = None
+
+    async def _create_endpoint(self, **kwargs):
+        loop = asyncio.get_running_loop()
+        self._closed = loop.create_future()
+        self.transport, _ = await loop.create_datagram_endpoint(lambda: self, **kwargs)
+
+    async def listen(self):
+        """Bind to host:port and recieve datagrams"""
+        await self._create_endpoint(local_addr=(self.host, self.port))
+
+    async def open(self):
+        """Unbound endpoint for sending to host:port"""
+        await self._create_endpoint(family=socket.AF_INET)
+
+    async def close(self):
+        if not self.transport:
+            return
+        self._flush()
+        self.transport.close()
+        await self._closed
+        self.transport = None
+
+    def connection_lost(self, exc):
+        if self._closed and not self._closed.done():
+            self._closed.set_result(exc)
+
+    def datagram_received(self, data, addr):
+        self._recieve(addr, data)
+
+    def error_received(self, exc):
+        if getattr(exc, 'errno', None) == 51:  # Network not avalable
+            return
+        log.warning(f'UDP error {exc}')
+
+    def _recieve(self, addr, raw_data):
+        print("received {0}: {1}".format(addr, raw_data))
+
+    def _send(self, raw_data):
+        assert self.transport, 'listen() or open() before sending'
+        if not self._send_queue:
+            asyncio.get_running_loop().call_soon(self._flush)
+        self._send_queue.append(raw_data)
+
+    def _flush(self):
+        send_queue, self._send_queue = self._send_queue, []
+        if self.transport.is_closing():
+            return
+        for raw_data in send_queue:
+            self.transport.sendto(raw_data, (self.host, self.port))
+
+
 from struct import Struct
 from collections import namedtuple
+import re
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 class Datagram(object):
+    r"""
+    Messages are encoded as `opcode_format` followed by the opcode's `struct`
+
+    >>> datagram = Datagram((
+    ...     Datagram.OpCodeDefinition('position', 1, ('x', 'y'), '<hh'),
+    ...     Datagram.OpCodeDefinition('color', 2, ('red', 'green', 'blue'), '<BBB'),
+    ... ))
+    >>> Position, Color = datagram.get_namedtuple('position'), datagram.get_namedtuple('color')
+    >>> buffer = datagram.encode_many((Position(1, -1), Color(255, 0, 128), Position(2, 3)))
+    >>> bytes(buffer)
+    b'\x01\x01\x00\xff\xff\x02\xff\x00\x80\x01\x02\x00\x03\x00'
+    >>> datagram.decode_many(buffer)
+    [position(x=1, y=-1), color(red=255, green=0, blue=128), position(x=2, y=3)]
+    """
     OpCodeDefinition = namedtuple('OpCodeDefinition', ('name', 'opcode', 'fields', 'struct'))
+    OpCodeCodec = namedtuple('OpCodeCodec', ('opcode', 'make', 'struct'))
+
+    # struct format character -> numpy type (standard sizes)
+    NUMPY_TYPES = {
+        'b': 'i1', 'B': 'u1', '?': 'b1',
+        'h': 'i2', 'H': 'u2', 'i': 'i4', 'I': 'u4', 'l': 'i4', 'L': 'u4', 'q': 'i8', 'Q': 'u8',
+        'e': 'f2', 'f': 'f4', 'd': 'f8',
+    }
 
-    def __init__(self,  opcode_defenitions):
+    def __init__(self,  opcode_defenitions, opcode_format='B'):
+        self.opcode_struct = Struct(opcode_format)
         self.lookup_opcode = {}
         self.lookup_namedtuple = {}
         self.lookup_struct = {}
+        self.lookup_codec = {}
         for opcode in opcode_defenitions:
             opcode_namedtuple = namedtuple(opcode.name, opcode.fields)
             self.lookup_opcode[opcode.opcode] = opcode_namedtuple
             self.lookup_opcode[opcode_namedtuple] = opcode.opcode
             self.lookup_namedtuple[opcode.name] = opcode_namedtuple
             self.lookup_struct[opcode_namedtuple] = Struct(opcode.struct)
+            # Precompiled dispatch for decode_many/encode_many
+            codec = self.OpCodeCodec(opcode.opcode, opcode_namedtuple._make, self.lookup_struct[opcode_namedtuple])
+            self.lookup_codec[opcode.opcode] = codec
+            self.lookup_codec[opcode_namedtuple] = codec
 
     def get_namedtuple(self, index):
         if (isinstance(index, int)):
@@ -74,3 +268,74 @@ class Datagram(object):
     def get_opcode(self, opcode_namedtuple):
         return self.lookup_opcode[opcode_namedtuple]
 
+    def decode_many(self, buffer, offset=0):
+        """
+        Decode a buffer of concatenated messages (read in place with `unpack_from`)
+        """
+        unpack_opcode_from = self.opcode_struct.unpack_from
+        opcode_size = self.opcode_struct.size
+        lookup_codec = self.lookup_codec
+        end = len(buffer)
+        messages = []
+        while offset < end:
+            opcode, = unpack_opcode_from(buffer, offset)
+            codec = lookup_codec[opcode]
+            offset += opcode_size
+            messages.append(codec.make(codec.struct.unpack_from(buffer, offset)))
+            offset += codec.struct.size
+        return messages
+
+    def encode_many(self, messages):
+        """
+        Encode messages (namedtuples from `get_namedtuple`) into one bytearray
+        """
+        codecs = tuple(self.lookup_codec[type(message)] for message in messages)
+        opcode_size = self.opcode_struct.size
+        buffer = bytearray(sum(opcode_size + codec.struct.size for codec in codecs))
+        pack_opcode_into = self.opcode_struct.pack_into
+        offset = 0
+        for codec, message in zip(codecs, messages):
+            pack_opcode_into(buffer, offset, codec.opcode)
+            offset += opcode_size
+            codec.struct.pack_into(buffer, offset, *message)
+            offset += codec.struct.size
+        return buffer
+
+    def get_dtype(self, opcode_namedtuple):
+        """
+        numpy structured dtype of a whole message (`opcode` + fields) for decode_array
+        """
+        def _numpy_types(fmt):
+            byteorder = fmt[0] if fmt[:1] in ('<', '>', '!', '=', '@') else '@'
+            byteorder = {'!': '>', '@': '='}.get(byteorder, byteorder)
+            for count, char in re.findall(r'(\d*)([a-zA-Z?])', fmt):
+                if char == 's':
+                    yield f'S{count or 1}'
+                elif char == 'x':
+                    yield f'V{count or 1}'
+                else:
+                    assert char in self.NUMPY_TYPES, f'struct format {char} has no numpy equivalent'
+                    for _ in range(int(count or 1)):
+                        yield byteorder + self.NUMPY_TYPES[char]
+        struct = self.get_struct(opcode_namedtuple)
+        field_types = tuple(_numpy_types(struct.format))
+        opcode_type, = _numpy_types(self.opcode_struct.format)
+        names = iter(opcode_namedtuple._fields)
+        dtype = np.dtype([('opcode', opcode_type)] + [
+            (f'_pad{index}' if field_type.startswith('V') else next(names), field_type)
+            for index, field_type in enumerate(field_types)
+        ])
+        assert dtype.itemsize == self.opcode_struct.size + struct.size, 'native struct alignment padding is not supported. Use a byte order prefix (e.g. "<")'
+        return dtype
+
+    def decode_array(self, buffer, opcode_namedtuple, offset=0, count=-1):
+        """
+        Decode a uniform run of messages with the same opcode as a numpy structured array view of the buffer (no copy)
+
+            positions = datagram.decode_array(buffer, Position)
+            positions['x'], positions['y']
+        """
+        assert np, 'numpy is required for decode_array'
+        array = np.frombuffer(buffer, dtype=self.get_dtype(opcode_namedtuple), count=count, offset=offset)
+        assert (array['opcode'] == self.get_opcode(opcode_namedtuple)).all(), 'decode_array requires a uniform run of one opcode'
+        return array